@@ -0,0 +1,177 @@
+import time #Built-in for Python 3.12.6
+import tempfile #Built-in for Python 3.12.6
+import fitz  # Also know as PyMuPDF, v1.24.10
+
+# Page text kept in memory per document before the rest is spilled to a temp file
+DEFAULT_MAX_MEMORY = 64 * 1024 * 1024
+
+# Page classification: a page without text that shows any image is a scan that needs
+# OCR, however small (receipts, cropped pages, A5 on A4). A page with a little text
+# still counts as a scan when its images cover at least IMAGE_PAGE_MIN_COVERAGE of
+# its area and its text blocks less than TEXT_PAGE_MIN_COVERAGE (a typed page
+# number or stamp on a scan)
+IMAGE_PAGE_MIN_COVERAGE = 0.5
+TEXT_PAGE_MIN_COVERAGE = 0.05
+
+PAGE_TEXT = 'text'
+PAGE_IMAGE = 'image'
+PAGE_EMPTY = 'empty'
+
+
+class ProcessingCancelled(Exception):
+    """ Raised between pages when the caller asked the pipeline to stop """
+
+
+def check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise ProcessingCancelled()
+
+
+def rect_coverage(rects, page_rect):
+    """ Fraction of the page area covered by `rects` (overlaps are counted twice, capped at 1) """
+    page_area = abs(page_rect)
+    if not page_area:
+        return 0.0
+    covered = sum(abs(fitz.Rect(rect) & page_rect) for rect in rects)
+    return min(1.0, covered / page_area)
+
+
+def classify_page(has_text, text_coverage, image_coverage):
+    """ Return PAGE_TEXT, PAGE_IMAGE or PAGE_EMPTY for one page """
+    if not has_text and image_coverage > 0:
+        return PAGE_IMAGE
+    if image_coverage >= IMAGE_PAGE_MIN_COVERAGE and text_coverage < TEXT_PAGE_MIN_COVERAGE:
+        return PAGE_IMAGE
+    if has_text:
+        return PAGE_TEXT
+    return PAGE_EMPTY
+
+
+class DocumentAnalysis:
+    """
+    Page text and metadata of one PDF, extracted in a single pass.
+
+    Every later pipeline step reads from this object instead of re-opening the
+    PDF and calling get_text() again. Page text is held in memory until
+    `max_memory` bytes (approximately, counted in characters) have been
+    collected; later pages are written to an anonymous temp file and read back
+    on demand, so very large books do not have to fit in RAM.
+
+    The same pass classifies every page from its text and image coverage (see
+    classify_page), so mixed documents can be OCR'd page by page.
+
+    The underlying fitz document stays open as `document` until close() is
+    called, for steps that need the pages themselves (e.g. chapter splitting).
+    """
+
+    def __init__(self, pdf_path, max_memory=DEFAULT_MAX_MEMORY, progress=None, cancel_event=None):
+        self.pdf_path = pdf_path
+        self.max_memory = max_memory
+        self.text_pages = []  # True for pages that have any extractable text
+        self.page_kinds = []  # PAGE_TEXT, PAGE_IMAGE or PAGE_EMPTY per page
+        self.text_coverage = []
+        self.image_coverage = []
+
+        self._pages = []  # str for in-memory pages, (offset, length) for spilled ones
+        self._memory_used = 0
+        self._spill_file = None
+        self._spill_size = 0
+        self.timings = {}  # Seconds spent opening the file and classifying/extracting its pages
+
+        start = time.perf_counter()
+        self.document = fitz.open(pdf_path)
+        try:
+            self.page_count = len(self.document)
+            self.metadata = dict(self.document.metadata or {})
+            self.toc = self.document.get_toc()
+            self.timings['open'] = time.perf_counter() - start
+            start = time.perf_counter()
+
+            if progress:
+                progress('analyze', 0, self.page_count)
+            for page_num in range(self.page_count):
+                check_cancelled(cancel_event)
+                page = self.document.load_page(page_num)
+                # Text blocks concatenate to the same string as get_text("text")
+                # and also give us the area covered by text
+                text_blocks = [block for block in page.get_text("blocks") if block[6] == 0]
+                text = "".join(block[4] for block in text_blocks)
+                text_coverage = rect_coverage((block[:4] for block in text_blocks), page.rect)
+                image_coverage = rect_coverage((info['bbox'] for info in page.get_image_info()), page.rect)
+
+                self.text_pages.append(bool(text.strip()))
+                self.text_coverage.append(text_coverage)
+                self.image_coverage.append(image_coverage)
+                self.page_kinds.append(classify_page(self.text_pages[-1], text_coverage, image_coverage))
+                self._store(text)
+                if progress:
+                    progress('analyze', page_num + 1, self.page_count)
+            self.timings['classify'] = time.perf_counter() - start
+        except BaseException:
+            self.close()
+            raise
+
+    def _store(self, text):
+        if self._memory_used + len(text) <= self.max_memory:
+            self._pages.append(text)
+            self._memory_used += len(text)
+            return
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile()
+        data = text.encode('utf-8')
+        self._spill_file.seek(self._spill_size)
+        self._spill_file.write(data)
+        self._pages.append((self._spill_size, len(data)))
+        self._spill_size += len(data)
+
+    @property
+    def spilled(self):
+        """ True when part of the page text lives in the temp file """
+        return self._spill_file is not None
+
+    def page_text(self, page_num):
+        """ Return the extracted text of one page """
+        page = self._pages[page_num]
+        if isinstance(page, str):
+            return page
+        offset, length = page
+        self._spill_file.seek(offset)
+        return self._spill_file.read(length).decode('utf-8')
+
+    def iter_page_texts(self):
+        """ Yield the text of every page in order """
+        for page_num in range(self.page_count):
+            yield self.page_text(page_num)
+
+    def text(self, max_chars=None):
+        """ Return the document text, one page per line block, cut off after `max_chars` if given """
+        parts = []
+        length = 0
+        for page_text in self.iter_page_texts():
+            parts.append(page_text + "\n")
+            length += len(page_text) + 1
+            if max_chars is not None and length >= max_chars:
+                return "".join(parts)[:max_chars]
+        return "".join(parts)
+
+    def is_text_based(self):
+        """ Check if the PDF contains text or is image-based """
+        return any(self.text_pages)
+
+    def ocr_pages(self):
+        """ Return the numbers of the pages that are scans without a usable text layer """
+        return [page_num for page_num, kind in enumerate(self.page_kinds) if kind == PAGE_IMAGE]
+
+    def close(self):
+        if self.document is not None:
+            self.document.close()
+            self.document = None
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,82 @@
+import os #Built-in for Python 3.12.6
+import random #Built-in for Python 3.12.6
+import fitz  # Also know as PyMuPDF, v1.24.10
+
+KINDS = ('text', 'image', 'mixed')
+PAGES_PER_CHAPTER = 10
+SCAN_DPI = 100  # Resolution of the simulated scans
+
+WORDS = (
+    'the of and to in is was for on that with as by at from his her which this are be had not but were '
+    'have one all their an they been has there who would will more if no out so said what up its about '
+    'into than them can only other new some could time these two may then do first any my now such like '
+    'our over man me even most made after also did many before must through back years where much your'
+).split()
+
+
+def corpus_name(kind, pages, chapters):
+    return f'{kind}-{pages}{"-chapters" if chapters else ""}'
+
+
+def page_text(rng, page_num, chapters):
+    """ Deterministic body text for one page, starting with a chapter heading where one is due """
+    lines = []
+    if chapters and page_num % PAGES_PER_CHAPTER == 0:
+        lines.append(f'Chapter {page_num // PAGES_PER_CHAPTER + 1}')
+        lines.append('')
+    for _ in range(30):
+        lines.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 12))))
+    return '\n'.join(lines)
+
+
+def add_text_page(document, text):
+    page = document.new_page()
+    page.insert_textbox(fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50), text, fontsize=10)
+    return page
+
+
+def add_image_page(document, text):
+    """ Add a page that only holds a picture of `text`, like a scan without OCR """
+    scratch = fitz.open()
+    pix = add_text_page(scratch, text).get_pixmap(dpi=SCAN_DPI, colorspace=fitz.csGRAY)
+    scratch.close()
+    page = document.new_page()
+    page.insert_image(page.rect, pixmap=pix)
+    return page
+
+
+def make_pdf(path, kind, pages, chapters=False, seed=0):
+    """
+    Write a synthetic PDF of `pages` pages.
+
+    'text' pages carry a text layer, 'image' pages are rendered scans of the
+    same kind of text, and 'mixed' documents have a typed first page followed
+    by a random (but seeded, so reproducible) mix of both.
+    """
+    if kind not in KINDS:
+        raise ValueError(f'Unknown corpus kind {kind!r}, expected one of {KINDS}')
+    rng = random.Random(f'{corpus_name(kind, pages, chapters)}-{seed}')
+    document = fitz.open()
+    for page_num in range(pages):
+        text = page_text(rng, page_num, chapters)
+        scanned = kind == 'image' or (kind == 'mixed' and page_num > 0 and rng.random() < 0.5)
+        if scanned:
+            add_image_page(document, text)
+        else:
+            add_text_page(document, text)
+    document.save(path, garbage=3, deflate=True)
+    document.close()
+    return path
+
+
+def ensure_corpus(corpus_dir, specs, seed=0):
+    """ Generate the PDFs for `specs` ((kind, pages, chapters) tuples) that are not in `corpus_dir` yet """
+    os.makedirs(corpus_dir, exist_ok=True)
+    paths = {}
+    for kind, pages, chapters in specs:
+        name = corpus_name(kind, pages, chapters)
+        path = os.path.join(corpus_dir, f'{name}-seed{seed}.pdf')
+        if not os.path.exists(path):
+            make_pdf(path, kind, pages, chapters, seed)
+        paths[name] = path
+    return paths
@@ -0,0 +1,193 @@
+"""
+Benchmark the pipeline stages on a synthetic corpus and compare against a baseline.
+
+    python -m bench.run [--scale 1.0] [--repeat 3] [--save-baseline] [--ocr]
+
+Run from the repository root. Every stage runs in a fresh subprocess so its
+peak RSS is measured on its own.
+"""
+import os #Built-in for Python 3.12.6
+import sys #Built-in for Python 3.12.6
+import json #Built-in for Python 3.12.6
+import time #Built-in for Python 3.12.6
+import shutil #Built-in for Python 3.12.6
+import argparse #Built-in for Python 3.12.6
+import tempfile #Built-in for Python 3.12.6
+import subprocess #Built-in for Python 3.12.6
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_CORPUS_DIR = os.path.join(BENCH_DIR, '.corpus')
+
+STAGES = ('analyze', 'split', 'docx', 'render', 'pipeline')
+
+# (kind, pages, chapters) at scale 1.0
+DEFAULT_CORPUS = (
+    ('text', 300, True),
+    ('text', 300, False),
+    ('image', 30, False),
+    ('mixed', 100, True),
+)
+
+
+def run_stage(stage, pdf_path, work_dir, ocr=False):
+    """
+    Time one stage on one PDF in this process and return its measurements.
+
+    Stages that work on an analysed document get the analysis prepared before
+    the clock starts, so only the stage itself is timed.
+    """
+    sys.path.insert(0, REPO_DIR)
+    import fitz
+    import engine
+    from instrumentation import peak_rss_kb
+    from analysis import DocumentAnalysis
+    from splitter import split_chapters
+
+    analysis = DocumentAnalysis(pdf_path) if stage in ('split', 'docx') else None
+    start = time.perf_counter()
+
+    if stage == 'analyze':
+        with DocumentAnalysis(pdf_path) as timed:
+            pages = timed.page_count
+    elif stage == 'split':
+        split_chapters(analysis, os.path.join(work_dir, 'chapters'))
+        pages = analysis.page_count
+    elif stage == 'docx':
+        engine.export_text(analysis, os.path.join(work_dir, 'out.docx'),
+                           os.path.join(work_dir, 'out.txt'), os.path.join(work_dir, 'out.md'))
+        pages = analysis.page_count
+    elif stage == 'render':
+        # The work viewer.PageRenderer does for each page that scrolls into view
+        with fitz.open(pdf_path) as document:
+            for page in document:
+                page.get_pixmap(alpha=False)
+            pages = len(document)
+    elif stage == 'pipeline':
+        result = engine.process_file(pdf_path, work_dir, ocr_mode='hybrid' if ocr else 'off')
+        if result['status'] != 'ok':
+            raise RuntimeError(result['error'])
+        pages = result['page_count']
+    else:
+        raise ValueError(f'Unknown stage {stage!r}')
+
+    wall = time.perf_counter() - start
+    if analysis is not None:
+        analysis.close()
+    return {'wall': wall, 'pages': pages, 'pages_per_sec': pages / wall if wall else None,
+            'peak_rss_kb': peak_rss_kb()}
+
+
+def measure(stage, pdf_path, repeat, ocr):
+    """ Run a stage `repeat` times in fresh subprocesses; keep the fastest time and the highest RSS """
+    runs = []
+    for _ in range(repeat):
+        work_dir = tempfile.mkdtemp(prefix='bench-')
+        try:
+            command = [sys.executable, '-m', 'bench.run', '--child', stage, pdf_path, work_dir]
+            if ocr:
+                command.append('--ocr')
+            completed = subprocess.run(command, cwd=REPO_DIR, capture_output=True, text=True)
+            if completed.returncode != 0:
+                raise RuntimeError(f'{stage} failed on {pdf_path}:\n{completed.stderr}')
+            runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    best = min(runs, key=lambda run: run['wall'])
+    rss = [run['peak_rss_kb'] for run in runs if run['peak_rss_kb'] is not None]
+    return dict(best, peak_rss_kb=max(rss) if rss else None)
+
+
+def compare(results, baseline, time_tolerance, rss_tolerance, min_time_delta=0.0):
+    """
+    Return a description of every measurement that is worse than the baseline allows.
+
+    A slowdown only counts when it exceeds both `time_tolerance` (relative) and
+    `min_time_delta` seconds, so millisecond-sized stages do not fail on noise.
+    """
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if current['wall'] > base['wall'] * (1 + time_tolerance) and current['wall'] - base['wall'] > min_time_delta:
+            regressions.append(f'{key}: wall {current["wall"]:.3f}s vs baseline {base["wall"]:.3f}s')
+        if current['peak_rss_kb'] and base.get('peak_rss_kb') \
+                and current['peak_rss_kb'] > base['peak_rss_kb'] * (1 + rss_tolerance):
+            regressions.append(f'{key}: peak RSS {current["peak_rss_kb"]} KiB vs baseline {base["peak_rss_kb"]} KiB')
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Benchmark the PDF pipeline stages on a synthetic corpus')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply the page counts of the default corpus')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, the fastest one counts')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the corpus generator')
+    parser.add_argument('--corpus-dir', default=DEFAULT_CORPUS_DIR)
+    parser.add_argument('--ocr', action='store_true', help='Run OCR in the pipeline stage (needs Tesseract)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--time-tolerance', type=float, default=0.25,
+                        help='Allowed slowdown against the baseline (0.25 = 25%%)')
+    parser.add_argument('--min-time-delta', type=float, default=0.02,
+                        help='Slowdowns smaller than this many seconds are never reported')
+    parser.add_argument('--rss-tolerance', type=float, default=0.25,
+                        help='Allowed peak RSS growth against the baseline')
+    parser.add_argument('--json', dest='json_path', default=None, help='Also write the results to this file')
+    parser.add_argument('--child', nargs=3, metavar=('STAGE', 'PDF', 'WORK_DIR'), help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.child:
+        stage, pdf_path, work_dir = args.child
+        print(json.dumps(run_stage(stage, pdf_path, work_dir, args.ocr)))
+        return 0
+
+    sys.path.insert(0, REPO_DIR)
+    from bench.corpus import ensure_corpus
+
+    specs = [(kind, max(1, round(pages * args.scale)), chapters) for kind, pages, chapters in DEFAULT_CORPUS]
+    corpus = ensure_corpus(args.corpus_dir, specs, args.seed)
+
+    results = {}
+    print(f'{"measurement":40} {"wall s":>9} {"pages/s":>9} {"peak RSS KiB":>13}')
+    for name, pdf_path in corpus.items():
+        for stage in args.stages:
+            key = f'{stage}/{name}'
+            results[key] = measure(stage, pdf_path, args.repeat, args.ocr)
+            r = results[key]
+            print(f'{key:40} {r["wall"]:9.3f} {r["pages_per_sec"] or 0:9.1f} {r["peak_rss_kb"] or "-":>13}')
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}, run with --save-baseline to create one')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.time_tolerance, args.rss_tolerance, args.min_time_delta)
+    if regressions:
+        print(f'\n{len(regressions)} REGRESSION(S) against {args.baseline}:')
+        for regression in regressions:
+            print(f'  {regression}')
+        return 1
+    print(f'\nNo regressions against {args.baseline}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
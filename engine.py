@@ -0,0 +1,428 @@
+import os #Built-in for Python 3.12.6
+import sys #Built-in for Python 3.12.6
+import json #Built-in for Python 3.12.6
+import argparse #Built-in for Python 3.12.6
+import multiprocessing #Built-in for Python 3.12.6
+from concurrent.futures import ProcessPoolExecutor, as_completed #Built-in for Python 3.12.6
+from analysis import DocumentAnalysis, ProcessingCancelled, check_cancelled, DEFAULT_MAX_MEMORY
+from ocr import OCR_MODES, ocr_full, ocr_hybrid
+from manifest import Manifest
+from export import export_pages
+from splitter import split_chapters, DEFAULT_HEADING_PATTERN
+from instrumentation import RunReport, PROFILERS, file_size, profiled
+
+# Bump when a change to the pipeline makes earlier outputs stale
+PIPELINE_VERSION = 2
+
+
+def split_into_chapters(analysis, chapters_dir, progress=None, cancel_event=None, **split_options):
+    """ Split the analysed PDF into chapter files, see splitter.split_chapters for the options """
+    return split_chapters(analysis, chapters_dir, progress=progress, cancel_event=cancel_event, **split_options)
+
+
+def stream_page_texts(analysis, stage, progress=None, cancel_event=None):
+    """ Yield the analysed page texts, reporting progress and honouring cancellation per page """
+    if progress:
+        progress(stage, 0, analysis.page_count)
+    for page_num, text in enumerate(analysis.iter_page_texts()):
+        check_cancelled(cancel_event)
+        yield text
+        # Resumed once the consumer has written the page
+        if progress:
+            progress(stage, page_num + 1, analysis.page_count)
+
+
+def export_text(analysis, docx_output_path, txt_path=None, md_path=None, progress=None, cancel_event=None,
+                preview_chars=0):
+    """
+    Stream the analysed PDF text into DOCX (and optionally plain-text/Markdown) files.
+
+    Returns up to `preview_chars` characters of the exported text for display.
+    """
+    pages = stream_page_texts(analysis, 'docx', progress, cancel_event)
+    return export_pages(pages, docx_output_path, txt_path, md_path, preview_chars)
+
+
+def output_paths(selected_file, output_path):
+    """ Return the per-file output locations used by the pipeline """
+    base_name = os.path.splitext(os.path.basename(selected_file))[0]
+    output_dir = os.path.join(output_path, base_name)
+    return {
+        'output_dir': output_dir,
+        'ocr_pdf': os.path.join(output_dir, 'ocr_pdf', os.path.basename(selected_file)),
+        'chapters_dir': os.path.join(output_dir, 'chapters'),
+        'docx': os.path.join(output_dir, 'text', f'{base_name}.docx'),
+        'text': os.path.join(output_dir, 'text', f'{base_name}.txt'),
+        'markdown': os.path.join(output_dir, 'text', f'{base_name}.md'),
+    }
+
+
+def process_file(selected_file, output_path, jobs=None, progress=None, cancel_event=None,
+                 max_memory=DEFAULT_MAX_MEMORY, keep_analysis=False, ocr_mode='hybrid', preview_chars=0,
+                 split_options=None, profiler=None):
+    """
+    Run OCR (when needed), chapter splitting and DOCX conversion for one PDF.
+
+    Never raises: failures are reported in the returned result dict so that a
+    single bad file does not abort a batch. `progress(stage, done, total)` is
+    called with done=0 when a stage starts and again after every page (or
+    chapter) that stage finished. Setting `cancel_event` (a threading.Event)
+    stops the run before the next page with status 'cancelled'. Hybrid OCR
+    reports and checks this per chunk of scanned pages (ocr.OCR_CHUNK_PAGES);
+    full OCR is a single ocrmypdf call that cannot be interrupted.
+
+    Pages are classified while the PDF is analysed. With `ocr_mode` 'hybrid'
+    only the scanned pages go through ocrmypdf and are spliced back into the
+    document; 'full' runs ocrmypdf over the whole file (skipping pages that
+    already have text) and 'off' never runs OCR.
+
+    Each PDF is analysed once (see analysis.DocumentAnalysis) and every step
+    shares that text. With `keep_analysis` a successful result also carries the
+    open 'original_analysis' and 'analysis' (the OCR output, or the same object
+    for text-based files); the caller must close() them.
+
+    The text is streamed page by page into the DOCX, .txt and .md outputs;
+    `preview_chars` > 0 adds the start of that text as 'text_preview'.
+    `split_options` are passed on to splitter.split_chapters.
+
+    Every stage is timed into result['metrics'] (a RunReport.to_dict(), so it
+    survives the trip back from a worker process). `profiler` ('cprofile' or
+    'sample') also profiles the whole file into <output>/profiles/.
+    """
+    paths = output_paths(selected_file, output_path)
+    report = RunReport()
+    progress = report.page_timer(selected_file, progress)
+    profile_path = os.path.join(output_path, 'profiles', os.path.splitext(os.path.basename(selected_file))[0])
+    result = {
+        'input': selected_file,
+        'status': 'ok',
+        'text_based': None,
+        'ocr_pdf': None,
+        'source_pdf': selected_file,
+        'chapters': [],
+        'docx': None,
+        'text': None,
+        'markdown': None,
+        'page_count': None,
+        'ocr_pages': 0,
+        'error': None,
+    }
+    original = analysis = None
+
+    try:
+        with profiled(profiler, profile_path):
+            os.makedirs(os.path.dirname(paths['ocr_pdf']), exist_ok=True)
+            os.makedirs(os.path.dirname(paths['docx']), exist_ok=True)
+
+            original = analysis = DocumentAnalysis(selected_file, max_memory, progress, cancel_event)
+            report.record(selected_file, 'open', original.timings['open'])
+            report.record(selected_file, 'classify', original.timings['classify'], original.page_count)
+            result['text_based'] = original.is_text_based()
+            ocr_pages = original.ocr_pages() if ocr_mode != 'off' else []
+            result['ocr_pages'] = len(ocr_pages)
+            if ocr_pages:
+                check_cancelled(cancel_event)
+                # Perform OCR first, the rest of the pipeline works on the OCR PDF
+                with report.stage(selected_file, 'ocr', len(ocr_pages)) as ocr_stage:
+                    if ocr_mode == 'full':
+                        # A single ocrmypdf call: no page progress, and cancelling waits for it
+                        if progress:
+                            progress('ocr', 0, 1)
+                        ocr_full(original, paths['ocr_pdf'], jobs)
+                        if progress:
+                            progress('ocr', 1, 1)
+                    else:
+                        ocr_hybrid(original, ocr_pages, paths['ocr_pdf'], jobs, progress, cancel_event)
+                    ocr_stage['bytes_written'] = file_size(paths['ocr_pdf'])
+                result['ocr_pdf'] = paths['ocr_pdf']
+                result['source_pdf'] = paths['ocr_pdf']
+                with report.stage(selected_file, 'analyze_ocr') as analyze_stage:
+                    analysis = DocumentAnalysis(paths['ocr_pdf'], max_memory, progress, cancel_event)
+                    analyze_stage['pages'] = analysis.page_count
+
+            result['page_count'] = analysis.page_count
+            with report.stage(selected_file, 'split', analysis.page_count) as split_stage:
+                result['chapters'] = split_into_chapters(analysis, paths['chapters_dir'], progress, cancel_event,
+                                                         **(split_options or {}))
+                split_stage['bytes_written'] = file_size(*result['chapters'])
+            with report.stage(selected_file, 'docx', analysis.page_count) as docx_stage:
+                preview = export_text(analysis, paths['docx'], paths['text'], paths['markdown'], progress,
+                                      cancel_event, preview_chars)
+                docx_stage['bytes_written'] = file_size(paths['docx'], paths['text'], paths['markdown'])
+            result['docx'], result['text'], result['markdown'] = paths['docx'], paths['text'], paths['markdown']
+            if preview_chars:
+                result['text_preview'] = preview
+    except ProcessingCancelled:
+        result['status'] = 'cancelled'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f'{type(e).__name__}: {e}'
+
+    if keep_analysis and result['status'] == 'ok':
+        result['original_analysis'] = original
+        result['analysis'] = analysis
+    else:
+        for opened in (original, analysis):
+            if opened is not None:
+                opened.close()
+
+    result['metrics'] = report.to_dict()
+    return result
+
+
+def pipeline_settings(ocr_mode='hybrid', split_options=None):
+    """ The settings that identify a pipeline run in the manifest """
+    # Worker count and compression level do not change what the chapters contain
+    split_options = split_options or {}
+    split_settings = {
+        'heading_pattern': split_options.get('heading_pattern') or DEFAULT_HEADING_PATTERN,
+        'use_toc': split_options.get('use_toc', True),
+        'chapter_docx': split_options.get('chapter_docx', False),
+    }
+    return {'version': PIPELINE_VERSION, 'ocr_mode': ocr_mode, 'split': split_settings}
+
+
+def cached_result(manifest, selected_file, output_path, settings):
+    """ Return a 'skipped' result if the manifest already holds this input's outputs, else None """
+    try:
+        stored = manifest.lookup(selected_file, settings, output_paths(selected_file, output_path)['output_dir'])
+    except OSError:
+        return None  # Unreadable input: let process_file report the error
+    if stored is None:
+        return None
+    return dict(stored, input=selected_file, status='skipped')
+
+
+def record_result(manifest, output_path, settings, result):
+    """ Store a successful result in the manifest so later runs can skip the file """
+    if result['status'] == 'ok':
+        manifest.record(result['input'], settings, output_paths(result['input'], output_path)['output_dir'], result)
+
+
+def output_conflicts(selected_files, output_path):
+    """
+    Map the index of every input whose output folder an earlier input already
+    uses (e.g. d1/x.pdf and d2/x.pdf both write to <output>/x) to that earlier input.
+    """
+    owners = {}
+    conflicts = {}
+    for index, selected_file in enumerate(selected_files):
+        output_dir = os.path.normcase(os.path.abspath(output_paths(selected_file, output_path)['output_dir']))
+        if output_dir in owners:
+            conflicts[index] = owners[output_dir]
+        else:
+            owners[output_dir] = selected_file
+    return conflicts
+
+
+def conflict_result(selected_file, other, output_path):
+    """ The error result for an input that would overwrite the outputs of `other` """
+    return {
+        'input': selected_file, 'status': 'error',
+        'error': f"Output folder {output_paths(selected_file, output_path)['output_dir']} is already used by "
+                 f"{other}; rename one of the files or process them into different output folders",
+    }
+
+
+def plan_workers(file_count, workers=None, jobs=None, cpu_count=None, split_workers=1):
+    """
+    Split the core budget between the file-level pool, ocrmypdf's own jobs and
+    the chapter split pool, and return (workers, jobs, split_workers).
+
+    OCR and splitting run one after the other, so a file uses at most
+    max(jobs, split_workers) cores at a time. By default every core runs one
+    file; when fewer files than cores are given the leftover cores go to
+    ocrmypdf so a small batch still uses the machine. An explicit `workers` or
+    `jobs` is taken as given, but `split_workers` is capped to the cores each
+    file worker has, so the nested split pools do not oversubscribe.
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    split_workers = max(1, split_workers or 1)
+    if workers is None:
+        workers = max(1, cpu_count // max(jobs or 1, split_workers))
+    workers = max(1, min(workers, file_count or 1))
+    if jobs is None:
+        jobs = max(1, cpu_count // workers)
+    split_workers = max(1, min(split_workers, cpu_count // workers))
+    return workers, jobs, split_workers
+
+
+def process_batch(selected_files, output_path, workers=None, jobs=None, on_result=None,
+                  max_memory=DEFAULT_MAX_MEMORY, ocr_mode='hybrid', incremental=False, split_options=None,
+                  report=None, profiler=None):
+    """
+    Process many PDFs over a process pool and return their result dicts in input order.
+
+    `on_result`, when given, is called with each result as soon as its file completes.
+    With `incremental`, files recorded in the output directory's manifest with
+    the same content and settings are returned with status 'skipped' instead
+    of being processed again, and every successful file is recorded.
+    Each file's 'metrics' are moved out of its result into `report` (a RunReport).
+    An input whose output folder an earlier input already uses fails instead of
+    overwriting that input's outputs (see output_conflicts).
+    """
+    results = [None] * len(selected_files)
+    settings = pipeline_settings(ocr_mode, split_options)
+    options = {'max_memory': max_memory, 'ocr_mode': ocr_mode, 'split_options': split_options,
+               'profiler': profiler}
+    manifest = Manifest(output_path) if incremental else None
+
+    def finish(index, result):
+        metrics = result.pop('metrics', None)
+        if report is not None:
+            report.merge(metrics)
+        results[index] = result
+        if manifest is not None:
+            record_result(manifest, output_path, settings, result)
+        if on_result:
+            on_result(result)
+
+    try:
+        pending = []
+        conflicts = output_conflicts(selected_files, output_path)
+        for index, selected_file in enumerate(selected_files):
+            if index in conflicts:
+                finish(index, conflict_result(selected_file, conflicts[index], output_path))
+                continue
+            cached = cached_result(manifest, selected_file, output_path, settings) if manifest else None
+            if cached:
+                finish(index, cached)
+            else:
+                pending.append(index)
+
+        workers, jobs, split_workers = plan_workers(len(pending), workers, jobs,
+                                                    split_workers=(split_options or {}).get('workers', 1))
+        options['split_options'] = dict(split_options or {}, workers=split_workers)
+        if workers == 1:
+            for index in pending:
+                finish(index, process_file(selected_files[index], output_path, jobs, **options))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(process_file, selected_files[index], output_path, jobs, **options): index
+                           for index in pending}
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # The worker process itself died (e.g. killed by the OS)
+                        result = {
+                            'input': selected_files[index], 'status': 'error',
+                            'error': f'{type(e).__name__}: {e}',
+                        }
+                    finish(index, result)
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+    return results
+
+
+def collect_pdfs(inputs):
+    """ Expand files and folders given on the command line into a list of PDFs """
+    selected_files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            selected_files.extend(sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith('.pdf')))
+        else:
+            selected_files.append(path)
+    return selected_files
+
+
+def add_pipeline_arguments(parser):
+    """ Add the options that control how each file is processed (shared with watcher.py) """
+    parser.add_argument('--ocr-mode', choices=OCR_MODES, default='hybrid',
+                        help='hybrid: OCR only scanned pages (default), full: OCR the whole file, off: never OCR')
+    parser.add_argument('--heading-pattern', default=None,
+                        help='Regex a page must start with to begin a chapter when the PDF has no outline '
+                             '(case-insensitive, default: the word "Chapter")')
+    parser.add_argument('--no-toc', action='store_true',
+                        help='Ignore the PDF outline and always split on headings')
+    parser.add_argument('--split-workers', type=int, default=1,
+                        help='Processes writing chapter files of one PDF in parallel')
+    parser.add_argument('--chapter-docx', action='store_true',
+                        help='Also write a DOCX per chapter')
+    parser.add_argument('--max-text-memory', type=int, default=DEFAULT_MAX_MEMORY // (1024 * 1024),
+                        help='MiB of page text kept in memory per document before spilling to disk')
+    parser.add_argument('--profile', choices=PROFILERS, default=None,
+                        help='Profile every processed file with cProfile (.prof) or the sampling profiler (.folded), '
+                             'written to <output>/profiles')
+
+
+def pipeline_options(args):
+    """ The process_file/process_batch keyword arguments selected by add_pipeline_arguments' options """
+    return {
+        'max_memory': args.max_text_memory * 1024 * 1024,
+        'ocr_mode': args.ocr_mode,
+        'split_options': {
+            'heading_pattern': args.heading_pattern,
+            'use_toc': not args.no_toc,
+            'workers': args.split_workers,
+            'chapter_docx': args.chapter_docx,
+        },
+        'profiler': args.profile,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Headless OCR, chapter splitting and DOCX export for PDFs')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    process_parser = subparsers.add_parser('process', help='Process PDF files or folders of PDFs')
+    process_parser.add_argument('inputs', nargs='+', help='PDF files or folders containing PDFs')
+    process_parser.add_argument('-o', '--output', required=True, help='Output directory')
+    process_parser.add_argument('-w', '--workers', type=int, default=None,
+                                help='Number of files processed in parallel (default: based on CPU count)')
+    process_parser.add_argument('-j', '--jobs', type=int, default=None,
+                                help='ocrmypdf jobs per file (default: cores left over per worker)')
+    add_pipeline_arguments(process_parser)
+    process_parser.add_argument('--force', action='store_true',
+                                help='Reprocess files even if the manifest says they are unchanged '
+                                     '(implied by --profile, since skipped files are not profiled)')
+    process_parser.add_argument('--no-report', action='store_true',
+                                help='Do not write the timing report to <output>/reports')
+    process_parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    prune_parser = subparsers.add_parser('prune', help='Drop stale entries from an output directory manifest')
+    prune_parser.add_argument('-o', '--output', required=True, help='Output directory')
+    prune_parser.add_argument('--max-age', type=float, default=None,
+                              help='Also drop entries older than this many days')
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == 'process':
+        selected_files = collect_pdfs(args.inputs)
+
+        def report(result):
+            if not args.json:
+                message = result['error'] if result['status'] == 'error' else result.get('docx')
+                print(f"[{result['status']}] {result['input']}: {message}")
+
+        run_report = RunReport()
+        # A profile of an incremental run would leave out every unchanged file
+        incremental = not (args.force or args.profile)
+        results = process_batch(selected_files, args.output, args.workers, args.jobs, on_result=report,
+                                incremental=incremental, report=run_report, **pipeline_options(args))
+        # Runs where every file was skipped have nothing to report
+        if not args.no_report and run_report.stages:
+            report_path = run_report.write(os.path.join(args.output, 'reports'))
+            if not args.json:
+                print(f'Report written to {report_path}')
+        if args.json:
+            json.dump(results, sys.stdout, indent=2)
+            print()
+        return 1 if any(r['status'] == 'error' for r in results) else 0
+
+    if args.command == 'prune':
+        with Manifest(args.output) as manifest:
+            print(f'Removed {manifest.prune(args.max_age)} stale manifest entries')
+        return 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
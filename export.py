@@ -0,0 +1,99 @@
+import re #Built-in for Python 3.12.6
+import zipfile #Built-in for Python 3.12.6
+from xml.sax.saxutils import escape #Built-in for Python 3.12.6
+
+# Characters that are not allowed in XML 1.0 (python-docx refuses them as well)
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+DOCUMENT_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+)
+DOCUMENT_END = '<w:sectPr/></w:body></w:document>'
+
+
+class DocxStreamWriter:
+    """
+    Writes a DOCX file one paragraph at a time.
+
+    Unlike python-docx, which keeps the whole document tree in memory until
+    save(), each paragraph is compressed into the zip as soon as it is added,
+    so memory use does not grow with the number of pages. Paragraphs look like
+    python-docx's add_paragraph(text): one run, with line breaks for newlines.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        self._zip.writestr('[Content_Types].xml', CONTENT_TYPES_XML)
+        self._zip.writestr('_rels/.rels', RELS_XML)
+        self._document = self._zip.open('word/document.xml', 'w', force_zip64=True)
+        self._document.write(DOCUMENT_START.encode('utf-8'))
+
+    def add_paragraph(self, text):
+        lines = escape(INVALID_XML_CHARS.sub('', text)).split('\n')
+        run = '<w:br/>'.join(f'<w:t xml:space="preserve">{line}</w:t>' for line in lines)
+        self._document.write(f'<w:p><w:r>{run}</w:r></w:p>'.encode('utf-8'))
+
+    def close(self):
+        if self._document is not None:
+            self._document.write(DOCUMENT_END.encode('utf-8'))
+            self._document.close()
+            self._document = None
+            self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def export_pages(page_texts, docx_path, txt_path=None, md_path=None, preview_chars=0):
+    """
+    Stream page texts into a DOCX file and, optionally, plain-text and Markdown files.
+
+    `page_texts` may be any iterable (typically a generator), it is consumed
+    exactly once. Returns the first `preview_chars` characters of the text as
+    written, for display, so callers never need to read the DOCX back.
+    """
+    preview = []
+    preview_left = preview_chars
+    txt_file = open(txt_path, 'w', encoding='utf-8') if txt_path else None
+    md_file = open(md_path, 'w', encoding='utf-8') if md_path else None
+    try:
+        with DocxStreamWriter(docx_path) as docx_writer:
+            for page_num, text in enumerate(page_texts):
+                docx_writer.add_paragraph(text)
+                if txt_file:
+                    txt_file.write(text + '\n')
+                if md_file:
+                    md_file.write(f'## Page {page_num + 1}\n\n')
+                    if text.strip():
+                        md_file.write(text.strip() + '\n\n')
+                if preview_left > 0:
+                    preview.append(text[:preview_left] + '\n')
+                    preview_left -= len(text) + 1
+    finally:
+        if txt_file:
+            txt_file.close()
+        if md_file:
+            md_file.close()
+    return ''.join(preview)[:preview_chars]
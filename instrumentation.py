@@ -0,0 +1,252 @@
+import os #Built-in for Python 3.12.6
+import sys #Built-in for Python 3.12.6
+import csv #Built-in for Python 3.12.6
+import json #Built-in for Python 3.12.6
+import time #Built-in for Python 3.12.6
+import cProfile #Built-in for Python 3.12.6
+import threading #Built-in for Python 3.12.6
+from collections import Counter #Built-in for Python 3.12.6
+from contextlib import contextmanager #Built-in for Python 3.12.6
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+try:
+    import psutil  # Optional, used for memory figures where resource is missing
+except ImportError:
+    psutil = None
+
+PROFILERS = ('cprofile', 'sample')
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples of the sampling profiler
+
+
+def peak_rss_kb():
+    """ Peak resident set size of this process in KiB, or None where it cannot be measured """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == 'darwin' else peak  # macOS reports bytes
+    if psutil is not None:
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss) // 1024  # peak_wset is Windows-only
+    return None
+
+
+def file_size(*paths):
+    """ Total size in bytes of the given files, ignoring missing ones """
+    return sum(os.path.getsize(path) for path in paths if path and os.path.exists(path))
+
+
+class RunReport:
+    """
+    Timings and sizes collected while a batch runs, written out as JSON and CSV.
+
+    Stage records hold the wall time, page count, bytes written and the
+    process memory high-water mark when the stage ended. Page records hold
+    the time between consecutive progress events of a stage, i.e. per page
+    (or per chapter for the split stage). Records can be added from several
+    threads, and records made in worker processes are carried back in the
+    result dicts (see to_dict/merge).
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.name = None  # Chosen by the first write(), later writes update the same files
+        self.stages = []
+        self.pages = []
+        self._lock = threading.Lock()
+
+    def record(self, file, stage, seconds, pages=None, bytes_written=None):
+        with self._lock:
+            self.stages.append({
+                'file': file, 'stage': stage, 'seconds': round(seconds, 6), 'pages': pages,
+                'bytes_written': bytes_written, 'peak_rss_kb': peak_rss_kb(),
+            })
+
+    def record_page(self, file, stage, page, seconds):
+        """ Record the time spent on one page (1-based) of a stage """
+        with self._lock:
+            self.pages.append({'file': file, 'stage': stage, 'page': page, 'seconds': round(seconds, 6)})
+
+    @contextmanager
+    def stage(self, file, stage, pages=None):
+        """ Time the block; it may set 'pages' and 'bytes_written' on the yielded dict """
+        details = {'pages': pages, 'bytes_written': None}
+        start = time.perf_counter()
+        try:
+            yield details
+        finally:
+            self.record(file, stage, time.perf_counter() - start, details['pages'], details['bytes_written'])
+
+    def page_timer(self, file, progress=None):
+        """
+        Wrap a progress(stage, done, total) callback so every event also records a page timing.
+
+        A stage reports done=0 when it starts and `done` after finishing that
+        page, so each record is the time since the stage's previous event,
+        labelled with the page it was spent on.
+        """
+        last = {}
+
+        def timed_progress(stage, done, total):
+            now = time.perf_counter()
+            if done > 0 and stage in last:
+                self.record_page(file, stage, done, now - last[stage])
+            last[stage] = now
+            if progress:
+                progress(stage, done, total)
+
+        return timed_progress
+
+    def to_dict(self):
+        with self._lock:
+            return {'stages': list(self.stages), 'pages': list(self.pages)}
+
+    def merge(self, data):
+        """ Add the records of another report's to_dict() """
+        if not data:
+            return
+        with self._lock:
+            self.stages.extend(data['stages'])
+            self.pages.extend(data['pages'])
+
+    def summary(self):
+        """ Totals per stage and per file, and per stage of the page records """
+        with self._lock:
+            stages = list(self.stages)
+            pages = list(self.pages)
+        per_stage = {}
+        per_file = {}
+        for record in stages:
+            total = per_stage.setdefault(record['stage'], {'seconds': 0.0, 'pages': 0, 'bytes_written': 0, 'count': 0})
+            total['seconds'] += record['seconds']
+            total['pages'] += record['pages'] or 0
+            total['bytes_written'] += record['bytes_written'] or 0
+            total['count'] += 1
+            per_file[record['file']] = per_file.get(record['file'], 0.0) + record['seconds']
+        for total in per_stage.values():
+            total['pages_per_sec'] = total['pages'] / total['seconds'] if total['seconds'] and total['pages'] else None
+        per_page_stage = {}
+        for record in pages:
+            total = per_page_stage.setdefault(record['stage'], {'seconds': 0.0, 'pages': 0, 'max_seconds': 0.0})
+            total['seconds'] += record['seconds']
+            total['pages'] += 1
+            total['max_seconds'] = max(total['max_seconds'], record['seconds'])
+        peaks = [record['peak_rss_kb'] for record in stages if record['peak_rss_kb'] is not None]
+        return {
+            'wall_seconds': time.time() - self.started_at,
+            'per_stage': per_stage,
+            'per_file_seconds': per_file,
+            'per_page_stage': per_page_stage,
+            'peak_rss_kb': max(peaks) if peaks else None,
+        }
+
+    def write(self, output_dir, name=None):
+        """
+        Write <name>.json (summary and all records), <name>_stages.csv and
+        <name>_pages.csv to `output_dir` and return the JSON path.
+
+        The default name is the start time; a report started in the same
+        second as an existing one gets a '-2', '-3', ... suffix instead of
+        overwriting it.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        if name is None:
+            if self.name is None:
+                base = time.strftime('run_report_%Y%m%d-%H%M%S', time.localtime(self.started_at))
+                self.name = base
+                suffix = 1
+                while os.path.exists(os.path.join(output_dir, f'{self.name}.json')):
+                    suffix += 1
+                    self.name = f'{base}-{suffix}'
+            name = self.name
+        data = self.to_dict()
+
+        json_path = os.path.join(output_dir, f'{name}.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(summary=self.summary(), **data), f, indent=2)
+
+        for suffix, records, fields in (
+                ('stages', data['stages'], ['file', 'stage', 'seconds', 'pages', 'bytes_written', 'peak_rss_kb']),
+                ('pages', data['pages'], ['file', 'stage', 'page', 'seconds'])):
+            with open(os.path.join(output_dir, f'{name}_{suffix}.csv'), 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(records)
+        return json_path
+
+
+class SamplingProfiler:
+    """
+    Low-overhead profiler that samples one thread's Python stack every `interval` seconds.
+
+    The result is written in the "folded stacks" format (one `frame;frame;... count`
+    line per distinct stack) understood by flamegraph.pl, speedscope and similar
+    tools. Unlike cProfile it does not slow down every function call, so it can
+    stay on in production runs.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+@contextmanager
+def profiled(profiler, path_without_extension):
+    """
+    Profile the block with 'cprofile' (writes .prof, open with pstats/snakeviz)
+    or 'sample' (writes .folded); with `profiler` None this does nothing.
+    """
+    if profiler is None:
+        yield None
+        return
+    if profiler not in PROFILERS:
+        raise ValueError(f'Unknown profiler {profiler!r}, expected one of {PROFILERS}')
+
+    os.makedirs(os.path.dirname(path_without_extension), exist_ok=True)
+    if profiler == 'cprofile':
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield profile
+        finally:
+            profile.disable()
+            profile.dump_stats(path_without_extension + '.prof')
+    else:
+        sampler = SamplingProfiler()
+        sampler.start()
+        try:
+            yield sampler
+        finally:
+            sampler.stop()
+            sampler.dump(path_without_extension + '.folded')
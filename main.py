@@ -1,14 +1,17 @@
 import sys #Built-in for Python 3.12.6
 import os #Built-in for Python 3.12.6
-import ocrmypdf #v16.5.0
-import fitz  # Also know as PyMuPDF, v1.24.10 
-from docx import Document
+import multiprocessing #Built-in for Python 3.12.6
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QFileDialog, QPushButton, QLabel,
-    QVBoxLayout, QHBoxLayout, QWidget, QMessageBox, QComboBox, QTextEdit, QScrollArea
+    QVBoxLayout, QHBoxLayout, QWidget, QMessageBox, QComboBox, QTextEdit,
+    QProgressBar
 ) #5.15.11 
-from PyQt5.QtGui import QImage, QPixmap #v5.15.11 
-from PyQt5.QtCore import Qt #v5.15.11 
+from instrumentation import RunReport
+from worker import ProcessWorker, start_worker
+from viewer import PageViewer
+
+# Text shown per pane in the comparison, so huge books do not flood the widgets
+COMPARISON_PREVIEW_CHARS = 1_000_000
 
 
 class OCRApp(QMainWindow):
@@ -18,6 +21,10 @@ class OCRApp(QMainWindow):
         self.selected_files = []  # To store selected files
         self.output_path = None
         self.mode = 'single'  # 'single' or 'multiple'
+        self.worker = None  # ProcessWorker of the running batch, if any
+        self.worker_thread = None
+        self.report = None  # RunReport of the last batch, which also collects the viewer's render times
+        self.report_dir = None
 
     def init_ui(self):
         self.setWindowTitle('OCR My PDF')
@@ -41,21 +48,24 @@ class OCRApp(QMainWindow):
         self.btn_process = QPushButton('Process PDF', self)
         self.btn_process.clicked.connect(self.process_files)
 
+        self.btn_cancel = QPushButton('Cancel', self)
+        self.btn_cancel.clicked.connect(self.cancel_processing)
+        self.btn_cancel.setEnabled(False)
+
+        # Progress of the running batch
+        self.label_status = QLabel('Idle', self)
+        self.progress_files = QProgressBar(self)
+        self.progress_pages = QProgressBar(self)
+
         # TextEdit fields for comparison (OCR PDF and DOCX)
         self.ocr_text_edit = QTextEdit(self)
         self.docx_text_edit = QTextEdit(self)
         self.ocr_text_edit.setReadOnly(True)
         self.docx_text_edit.setReadOnly(True)
 
-        # Create a scroll area for image-based PDFs
-        self.scroll_area = QScrollArea(self)
-        self.scroll_area.setWidgetResizable(True)
-
-        # Set up the layout for displaying images
-        self.scroll_area_widget_layout = QVBoxLayout()
-        self.scroll_area_widget = QWidget()
-        self.scroll_area_widget.setLayout(self.scroll_area_widget_layout)
-        self.scroll_area.setWidget(self.scroll_area_widget)
+        # Page viewer for image-based PDFs, only renders the pages in view
+        self.page_viewer = PageViewer(self)
+        self.page_viewer.page_timed.connect(self.on_page_rendered)
 
         # Layout
         main_layout = QVBoxLayout()
@@ -65,10 +75,14 @@ class OCRApp(QMainWindow):
         main_layout.addWidget(self.label_output)
         main_layout.addWidget(self.btn_output)
         main_layout.addWidget(self.btn_process)
+        main_layout.addWidget(self.btn_cancel)
+        main_layout.addWidget(self.label_status)
+        main_layout.addWidget(self.progress_files)
+        main_layout.addWidget(self.progress_pages)
 
         # Horizontal layout for image display and text comparison
         horizontal_layout = QHBoxLayout()
-        horizontal_layout.addWidget(self.scroll_area)
+        horizontal_layout.addWidget(self.page_viewer)
 
         # Add text comparison widgets side by side
         comparison_layout = QHBoxLayout()
@@ -116,159 +130,116 @@ class OCRApp(QMainWindow):
             self.label_output.setText(f'Output Path: {self.output_path}')
 
     def process_files(self):
-        if self.selected_files and self.output_path:
-            for selected_file in self.selected_files:
-                base_name = os.path.splitext(os.path.basename(selected_file))[0]
-                output_dir = os.path.join(self.output_path, base_name)
-                ocr_pdf_dir = os.path.join(output_dir, 'ocr_pdf')
-                text_dir = os.path.join(output_dir, 'text')
-                os.makedirs(ocr_pdf_dir, exist_ok=True)
-                os.makedirs(text_dir, exist_ok=True)
-                output_file = os.path.join(ocr_pdf_dir, os.path.basename(selected_file))
-
-                try:
-                    if self.is_text_based(selected_file):
-                        # Directly split into chapters and convert to DOCX
-                        self.split_into_chapters(selected_file, os.path.join(output_dir, 'chapters'))
-                        self.convert_to_docx(selected_file, os.path.join(text_dir, f'{base_name}.docx'))
-                    else:
-                        # Perform OCR, split into chapters, and convert OCR PDF to DOCX
-                        ocrmypdf.ocr(selected_file, output_file)
-                        self.split_into_chapters(output_file, os.path.join(output_dir, 'chapters'))
-                        self.convert_to_docx(output_file, os.path.join(text_dir, f'{base_name}.docx'))
-
-                    # After processing, show the visual comparison
-                    self.compare_and_show(selected_file, output_file, os.path.join(text_dir, f'{base_name}.docx'))
-
-                except Exception as e:
-                    print(f'Error processing file {selected_file}: {e}')
-
-            self.show_message('Success', 'All files have been processed successfully.')
-
-    def is_text_based(self, pdf_path):
-        """ Check if the PDF contains text or is image-based """
-        try:
-            pdf_document = fitz.open(pdf_path)
-            for page_num in range(len(pdf_document)):
-                page = pdf_document.load_page(page_num)
-                text = page.get_text("text")
-                if text.strip():  # If there's any text on the page
-                    pdf_document.close()
-                    return True
-            pdf_document.close()
-            return False
-        except Exception as e:
-            print(f'Error checking PDF type: {e}')
-            return False
-
-    def split_into_chapters(self, pdf_path, chapters_dir):
-        try:
-            pdf_document = fitz.open(pdf_path)
-            chapter_start_pages = []
-
-            for page_num in range(len(pdf_document)):
-                page = pdf_document.load_page(page_num)
-                text = page.get_text("text")
-
-                if text:
-                    first_word = text.split()[0].lower()
-                    if first_word == 'chapter':
-                        chapter_start_pages.append(page_num)
-
-            os.makedirs(chapters_dir, exist_ok=True)
-
-            for i, start_page in enumerate(chapter_start_pages):
-                end_page = chapter_start_pages[i + 1] if i + 1 < len(chapter_start_pages) else len(pdf_document)
-                chapter_pdf_path = os.path.join(chapters_dir, f'{os.path.basename(pdf_path).replace(".pdf", f"_chapter_{i+1}.pdf")}')
-                chapter_pdf = fitz.open()
-                for page_num in range(start_page, end_page):
-                    chapter_pdf.insert_pdf(pdf_document, from_page=page_num, to_page=page_num)
-                chapter_pdf.save(chapter_pdf_path)
-                chapter_pdf.close()
-
-            pdf_document.close()
-        except Exception as e:
-            print(f'Error splitting chapters: {e}')
-
-    def convert_to_docx(self, pdf_path, docx_output_path):
-        """ Convert the PDF text to a DOCX file """
+        if self.selected_files and self.output_path and self.worker is None:
+            self.write_report()  # Render times collected since the previous batch finished
+            self.report = RunReport()
+            self.report_dir = os.path.join(self.output_path, 'reports')
+            # Folder runs skip PDFs that are unchanged since they were last processed
+            self.worker = ProcessWorker(self.selected_files, self.output_path,
+                                        incremental=self.mode == 'multiple',
+                                        preview_chars=COMPARISON_PREVIEW_CHARS, report=self.report)
+            self.worker.file_started.connect(self.on_file_started)
+            self.worker.page_progress.connect(self.on_page_progress)
+            self.worker.file_finished.connect(self.on_file_finished)
+            self.worker.finished.connect(self.on_processing_finished)
+
+            self.progress_files.setRange(0, len(self.selected_files))
+            self.progress_files.setValue(0)
+            self.progress_pages.setValue(0)
+            self.btn_process.setEnabled(False)
+            self.btn_cancel.setEnabled(True)
+            self.worker_thread = start_worker(self.worker, self)
+
+    def cancel_processing(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.btn_cancel.setEnabled(False)
+            self.label_status.setText('Cancelling...')
+
+    def on_file_started(self, selected_file, index, total):
+        self.label_status.setText(f'Processing {index + 1}/{total}: {os.path.basename(selected_file)}')
+        self.progress_files.setValue(index)
+        self.progress_pages.setValue(0)
+
+    def on_page_progress(self, selected_file, stage, done, total):
+        self.progress_pages.setRange(0, total)
+        self.progress_pages.setValue(done)
+        self.progress_pages.setFormat(f'{stage}: %v/%m')
+
+    def on_file_finished(self, result):
+        self.progress_files.setValue(self.progress_files.value() + 1)
+        if result['status'] == 'error':
+            print(f"Error processing file {result['input']}: {result['error']}")
+        elif result['status'] == 'ok':
+            # Show the visual comparison as soon as this file is done
+            try:
+                with self.report.stage(result['input'], 'preview', result['page_count']):
+                    self.compare_and_show(result['original_analysis'], result['analysis'], result['text_preview'])
+            finally:
+                result['original_analysis'].close()
+                result['analysis'].close()
+
+    def on_processing_finished(self, results):
+        self.worker = None
+        self.worker_thread = None
+        self.btn_process.setEnabled(True)
+        self.btn_cancel.setEnabled(False)
+
+        self.write_report()
+
+        failed = [r for r in results if r['status'] == 'error']
+        skipped = [r for r in results if r['status'] == 'skipped']
+        if any(r['status'] == 'cancelled' for r in results) or len(results) < len(self.selected_files):
+            self.label_status.setText('Cancelled')
+            self.show_message('Cancelled', f'Processing was cancelled after {len(results)} file(s).')
+        elif failed:
+            self.label_status.setText('Done with errors')
+            self.show_message('Error', f'{len(failed)} of {len(results)} file(s) could not be processed.')
+        else:
+            self.label_status.setText('Done')
+            message = 'All files have been processed successfully.'
+            if skipped:
+                message += f' {len(skipped)} unchanged file(s) were skipped.'
+            self.show_message('Success', message)
+
+    def closeEvent(self, event):
+        # Stop the background batch cleanly before the window goes away
+        if self.worker_thread is not None:
+            self.worker.cancel()
+            self.worker_thread.quit()
+            self.worker_thread.wait()
+        self.page_viewer.shutdown()
+        self.write_report()
+        super().closeEvent(event)
+
+    def on_page_rendered(self, pdf_path, page_num, seconds):
+        # Pages render lazily as they scroll into view, so these keep arriving after the batch finished
+        if self.report is not None:
+            self.report.record_page(pdf_path, 'render', page_num + 1, seconds)
+
+    def write_report(self):
+        """ Write (or rewrite, with the render times added since) the last batch's run report """
+        if self.report is None or not (self.report.stages or self.report.pages):
+            return  # Nothing was processed or rendered, e.g. every file was skipped
         try:
-            pdf_document = fitz.open(pdf_path)
-            doc = Document()
-
-            for page_num in range(len(pdf_document)):
-                page = pdf_document.load_page(page_num)
-                text = page.get_text("text")
-                doc.add_paragraph(text)
-
-            doc.save(docx_output_path)
-            pdf_document.close()
-        except Exception as e:
-            print(f'Error converting PDF to DOCX: {e}')
+            self.report.write(self.report_dir)
+        except OSError as e:
+            print(f'Error writing run report: {e}')
 
-    def compare_and_show(self, original_pdf, ocr_pdf, docx_file):
+    def compare_and_show(self, original, analysis, docx_text):
         """Perform the visual comparison between the original, OCR, and DOCX files"""
-        # If the original PDF is image-based, show the page images
-        if not self.is_text_based(original_pdf):
-            self.display_pdf_images(original_pdf)
+        # If the original PDF has scanned pages, show the page images
+        if original.ocr_pages():
+            self.display_pdf_images(original.pdf_path)
         else:
-            original_text = self.extract_text_from_pdf(original_pdf)
-            self.ocr_text_edit.setText(original_text)
+            self.page_viewer.clear()
 
-        ocr_text = self.extract_text_from_pdf(ocr_pdf)
-        docx_text = self.extract_text_from_docx(docx_file)
-        self.show_comparison(ocr_text, docx_text)
+        # docx_text is the start of the text as it was streamed into the DOCX
+        self.show_comparison(analysis.text(COMPARISON_PREVIEW_CHARS), docx_text)
 
     def display_pdf_images(self, pdf_path):
-        """ Display all page images of the original PDF in a scrollable view """
-        self.scroll_area_widget_layout.setSpacing(10)
-        self.scroll_area_widget_layout.setAlignment(Qt.AlignTop)
-
-        pdf_document = fitz.open(pdf_path)
-        self.scroll_area_widget_layout.addStretch()  # Add stretchable space before images
-
-        for page_num in range(len(pdf_document)):
-            page = pdf_document.load_page(page_num)
-            pix = page.get_pixmap()
-
-            # Convert PyMuPDF pixmap to QImage
-            image = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format_RGB888)
-            
-            # Convert QImage to QPixmap
-            qt_image = QPixmap.fromImage(image)
-            
-            # Create QLabel to hold the pixmap
-            image_label = QLabel()
-            image_label.setPixmap(qt_image)
-            
-            # Add the QLabel (image) to the layout
-            self.scroll_area_widget_layout.addWidget(image_label)
-
-        pdf_document.close()
-
-    def extract_text_from_pdf(self, pdf_path):
-        """ Extract text from a PDF file """
-        try:
-            pdf_document = fitz.open(pdf_path)
-            text = ""
-            for page_num in range(len(pdf_document)):
-                page = pdf_document.load_page(page_num)
-                text += page.get_text("text") + "\n"
-            pdf_document.close()
-            return text
-        except Exception as e:
-            print(f'Error extracting text from PDF: {e}')
-            return ""
-
-    def extract_text_from_docx(self, docx_path):
-        """ Extract text from a DOCX file """
-        try:
-            doc = Document(docx_path)
-            text = "\n".join([para.text for para in doc.paragraphs])
-            return text
-        except Exception as e:
-            print(f'Error extracting text from DOCX: {e}')
-            return ""
+        """ Display the page images of the original PDF in the lazily rendered page viewer """
+        self.page_viewer.load(pdf_path)
 
     def show_comparison(self, text1, text2):
         """ Display comparison between two texts (OCR and DOCX) """
@@ -283,6 +254,7 @@ class OCRApp(QMainWindow):
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = OCRApp()
     window.show()
@@ -0,0 +1,174 @@
+import os #Built-in for Python 3.12.6
+import json #Built-in for Python 3.12.6
+import time #Built-in for Python 3.12.6
+import hashlib #Built-in for Python 3.12.6
+import sqlite3 #Built-in for Python 3.12.6
+
+MANIFEST_NAME = '.ocr_manifest.sqlite'
+HASH_CHUNK_SIZE = 1024 * 1024
+OUTPUT_KEYS = ('docx', 'text', 'markdown', 'ocr_pdf')  # Result keys holding a file in the output directory
+
+
+def settings_key(settings):
+    """ Stable short hash of the pipeline settings that influence the outputs """
+    encoded = json.dumps(settings, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def hash_file(path):
+    """ SHA-256 of a file's content, read in chunks """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Persistent record of the files already processed into one output directory.
+
+    Entries are keyed by the input's content hash, the pipeline settings and the
+    output directory, so an identical input is only processed once per set of
+    settings. Content hashes are cached against (path, size, mtime), which makes
+    the check for an untouched file a single indexed lookup without reading it.
+    An entry is written as soon as its file finishes, so an interrupted batch
+    resumes with the files that had not completed yet. Output paths are stored
+    relative to the entry's output directory, so entries do not depend on the
+    working directory the run was started from.
+
+    A Manifest must be used from the thread that created it (sqlite3 rule).
+    """
+
+    def __init__(self, output_path):
+        os.makedirs(output_path, exist_ok=True)
+        self.path = os.path.join(output_path, MANIFEST_NAME)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                content_hash TEXT NOT NULL,
+                settings_key TEXT NOT NULL,
+                output_dir TEXT NOT NULL,
+                input_path TEXT NOT NULL,
+                result TEXT NOT NULL,
+                completed_at REAL NOT NULL,
+                PRIMARY KEY (content_hash, settings_key, output_dir)
+            );
+        ''')
+
+    def content_hash(self, path):
+        """ Return the content hash of `path`, re-reading the file only if it changed on disk """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        row = self.connection.execute(
+            'SELECT content_hash FROM file_hashes WHERE path = ? AND size = ? AND mtime_ns = ?',
+            (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+        if row:
+            return row[0]
+        content_hash = hash_file(path)
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)',
+                                    (path, stat.st_size, stat.st_mtime_ns, content_hash))
+        return content_hash
+
+    def lookup(self, path, settings, output_dir):
+        """ Return the stored result for an unchanged input whose outputs still exist, else None """
+        row = self.connection.execute(
+            'SELECT result FROM entries WHERE content_hash = ? AND settings_key = ? AND output_dir = ?',
+            (self.content_hash(path), settings_key(settings), os.path.abspath(output_dir))).fetchone()
+        if not row:
+            return None
+        result = resolve_outputs(json.loads(row[0]), output_dir)
+        if not outputs_exist(result):
+            return None
+        return result
+
+    def record(self, path, settings, output_dir, result):
+        """
+        Remember a successfully processed input.
+
+        Entries of other inputs or settings for the same output directory are
+        dropped: their files have just been overwritten.
+        """
+        output_dir = os.path.abspath(output_dir)
+        content_hash = self.content_hash(path)
+        key = settings_key(settings)
+        stored = {k: v for k, v in result.items() if k not in ('analysis', 'original_analysis', 'text_preview', 'metrics')}
+        stored = relative_outputs(stored, output_dir)
+        with self.connection:
+            self.connection.execute(
+                'DELETE FROM entries WHERE output_dir = ? AND NOT (content_hash = ? AND settings_key = ?)',
+                (output_dir, content_hash, key))
+            self.connection.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                (content_hash, key, output_dir, os.path.abspath(path), json.dumps(stored), time.time()))
+
+    def prune(self, max_age_days=None):
+        """
+        Remove stale entries and return how many were dropped.
+
+        An entry is stale when its input file is gone or has different content,
+        when its outputs were deleted, or (with `max_age_days`) when it is older
+        than that. Cached hashes of vanished files are dropped as well.
+        """
+        cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+        stale = []
+        rows = self.connection.execute(
+            'SELECT content_hash, settings_key, output_dir, input_path, result, completed_at FROM entries').fetchall()
+        for content_hash, key, output_dir, input_path, result, completed_at in rows:
+            if (cutoff is not None and completed_at < cutoff) \
+                    or not outputs_exist(resolve_outputs(json.loads(result), output_dir)) \
+                    or not os.path.exists(input_path) or self.content_hash(input_path) != content_hash:
+                stale.append((content_hash, key, output_dir))
+
+        with self.connection:
+            self.connection.executemany(
+                'DELETE FROM entries WHERE content_hash = ? AND settings_key = ? AND output_dir = ?', stale)
+            for (path,) in self.connection.execute('SELECT path FROM file_hashes').fetchall():
+                if not os.path.exists(path):
+                    self.connection.execute('DELETE FROM file_hashes WHERE path = ?', (path,))
+        return len(stale)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def relative_outputs(result, output_dir):
+    """ Copy of `result` with its output paths relative to `output_dir` and the other paths absolute """
+    stored = dict(result)
+    for key in OUTPUT_KEYS:
+        if stored.get(key):
+            stored[key] = os.path.relpath(os.path.abspath(stored[key]), output_dir)
+    stored['chapters'] = [os.path.relpath(os.path.abspath(path), output_dir) for path in stored.get('chapters') or []]
+    for key in ('input', 'source_pdf'):
+        if stored.get(key):
+            stored[key] = os.path.abspath(stored[key])
+    return stored
+
+
+def resolve_outputs(stored, output_dir):
+    """ Reverse relative_outputs(): output paths joined to the entry's `output_dir` """
+    result = dict(stored)
+    for key in OUTPUT_KEYS:
+        if result.get(key):
+            result[key] = os.path.join(output_dir, result[key])
+    result['chapters'] = [os.path.join(output_dir, path) for path in result.get('chapters') or []]
+    return result
+
+
+def outputs_exist(result):
+    """ Check that the files a stored result points to are still on disk """
+    paths = [result.get(key) for key in ('docx', 'text', 'markdown', 'ocr_pdf')] + list(result.get('chapters') or [])
+    return all(os.path.exists(path) for path in paths if path)
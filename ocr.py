@@ -0,0 +1,102 @@
+import os #Built-in for Python 3.12.6
+import tempfile #Built-in for Python 3.12.6
+import ocrmypdf #v16.5.0
+import fitz  # Also know as PyMuPDF, v1.24.10
+from analysis import check_cancelled
+
+OCR_MODES = ('hybrid', 'full', 'off')
+# Scanned pages per ocrmypdf call in hybrid mode; progress and cancellation happen between calls
+OCR_CHUNK_PAGES = 10
+
+
+def page_runs(page_numbers):
+    """ Group sorted page numbers into (first, last) runs of consecutive pages """
+    runs = []
+    for page_num in page_numbers:
+        if runs and runs[-1][1] == page_num - 1:
+            runs[-1][1] = page_num
+        else:
+            runs.append([page_num, page_num])
+    return [tuple(run) for run in runs]
+
+
+def _split_runs(page_count, ocr_pages):
+    """ Split 0..page_count-1 into (first, last) runs that are either all OCR pages or all kept pages """
+    runs = []
+    for page_num in range(page_count):
+        if runs and (page_num in ocr_pages) == (runs[-1][0] in ocr_pages):
+            runs[-1][1] = page_num
+        else:
+            runs.append([page_num, page_num])
+    return [tuple(run) for run in runs]
+
+
+def ocr_full(analysis, output_pdf, jobs=None):
+    """ Run ocrmypdf over the whole document, leaving pages that already have text alone """
+    ocrmypdf.ocr(analysis.pdf_path, output_pdf, jobs=jobs, skip_text=True, progress_bar=False)
+    return output_pdf
+
+
+def ocr_chunks(page_numbers, jobs=None):
+    """ Split the sorted scanned pages into chunks big enough to keep `jobs` OCR processes busy """
+    size = max(OCR_CHUNK_PAGES, 2 * (jobs or os.cpu_count() or 1))
+    return [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+
+
+def ocr_hybrid(analysis, page_numbers, output_pdf, jobs=None, progress=None, cancel_event=None):
+    """
+    OCR only `page_numbers` of the analysed PDF and splice them back into a copy of it.
+
+    The scanned pages are copied into temporary PDFs of a few pages each that
+    ocrmypdf processes with `jobs` pages in parallel; every other page is
+    copied from the original untouched, so good text layers are never
+    rasterized or re-recognized. Between chunks `progress('ocr', done, total)`
+    is called and `cancel_event` is checked, so a long scan can be stopped
+    without waiting for all of it.
+    """
+    page_numbers = sorted(page_numbers)
+    source = analysis.document
+
+    # Every document is opened in a with block so a cancel or an ocrmypdf error does not leak them
+    with tempfile.TemporaryDirectory() as temp_dir, fitz.open() as ocr_document:
+        if progress:
+            progress('ocr', 0, len(page_numbers))
+        done = 0
+        for index, chunk in enumerate(ocr_chunks(page_numbers, jobs)):
+            check_cancelled(cancel_event)
+            chunk_in = os.path.join(temp_dir, f'pages_{index}.pdf')
+            chunk_out = os.path.join(temp_dir, f'pages_{index}_ocr.pdf')
+
+            with fitz.open() as subset:
+                for first, last in page_runs(chunk):
+                    subset.insert_pdf(source, from_page=first, to_page=last)
+                subset.save(chunk_in, garbage=3, deflate=True)
+
+            # Scans that carry a little text (page numbers, stamps) would make ocrmypdf
+            # refuse the file, so such chunks are rasterized and recognized in full
+            force_ocr = any(analysis.text_pages[page_num] for page_num in chunk)
+            ocrmypdf.ocr(chunk_in, chunk_out, jobs=jobs, force_ocr=force_ocr, progress_bar=False)
+            with fitz.open(chunk_out) as chunk_document:
+                ocr_document.insert_pdf(chunk_document)
+
+            done += len(chunk)
+            if progress:
+                progress('ocr', done, len(page_numbers))
+
+        ocr_pages = set(page_numbers)
+        with fitz.open() as output:
+            ocr_index = 0
+            for first, last in _split_runs(analysis.page_count, ocr_pages):
+                if first in ocr_pages:
+                    output.insert_pdf(ocr_document, from_page=ocr_index, to_page=ocr_index + last - first)
+                    ocr_index += last - first + 1
+                else:
+                    output.insert_pdf(source, from_page=first, to_page=last)
+
+            output.set_metadata(analysis.metadata)
+            if analysis.toc:
+                output.set_toc(analysis.toc)
+            output.save(output_pdf, garbage=3, deflate=True)
+
+    return output_pdf
+
@@ -0,0 +1,134 @@
+import os #Built-in for Python 3.12.6
+import re #Built-in for Python 3.12.6
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait #Built-in for Python 3.12.6
+import fitz  # Also know as PyMuPDF, v1.24.10
+from analysis import check_cancelled
+from export import export_pages
+
+# A page starts a chapter when its text begins with the word "Chapter"
+DEFAULT_HEADING_PATTERN = r'chapter(?:\s|$)'
+CANCEL_POLL_SECONDS = 0.1  # How often the parallel split checks for cancellation
+
+_worker_source = None  # The source document of a split pool worker, see _open_worker_source
+
+
+def toc_chapter_starts(toc, page_count):
+    """ Chapter start pages (0-based) from the top level of a PDF outline """
+    if not toc:
+        return []
+    top_level = min(level for level, _, _ in toc)
+    starts = {page - 1 for level, _, page in toc if level == top_level and 1 <= page <= page_count}
+    return sorted(starts)
+
+
+def heading_chapter_starts(analysis, heading_pattern=DEFAULT_HEADING_PATTERN):
+    """ Chapter start pages (0-based) whose cached text begins with `heading_pattern` (case-insensitive) """
+    heading = re.compile(heading_pattern, re.IGNORECASE)
+    return [page_num for page_num, text in enumerate(analysis.iter_page_texts())
+            if heading.match(text.lstrip())]
+
+
+def find_chapter_starts(analysis, heading_pattern=None, use_toc=True):
+    """
+    Return the first page of every chapter.
+
+    The PDF outline is used when present (and `use_toc` is set), since it is
+    exact and costs nothing to read; otherwise the page text is searched for
+    `heading_pattern`.
+    """
+    if use_toc:
+        starts = toc_chapter_starts(analysis.toc, analysis.page_count)
+        if starts:
+            return starts
+    return heading_chapter_starts(analysis, heading_pattern or DEFAULT_HEADING_PATTERN)
+
+
+def chapter_ranges(starts, page_count):
+    """ Turn chapter start pages into (first, last) page ranges """
+    return [(start, (starts[i + 1] if i + 1 < len(starts) else page_count) - 1)
+            for i, start in enumerate(starts)]
+
+
+def write_chapter(source, first, last, chapter_pdf_path, garbage=3, deflate=True):
+    """
+    Copy pages `first`..`last` of `source` (an open document or a path) into a new PDF.
+
+    The whole range goes through a single insert_pdf call so resources shared
+    between the pages (fonts, images) are copied once.
+    """
+    source_document = fitz.open(source) if isinstance(source, str) else source
+    try:
+        chapter_pdf = fitz.open()
+        chapter_pdf.insert_pdf(source_document, from_page=first, to_page=last)
+        chapter_pdf.save(chapter_pdf_path, garbage=garbage, deflate=deflate)
+        chapter_pdf.close()
+    finally:
+        if source_document is not source:
+            source_document.close()
+    return chapter_pdf_path
+
+
+def _open_worker_source(pdf_path):
+    """ Split pool initializer: open the source once per worker process (fitz documents cannot be pickled) """
+    global _worker_source
+    _worker_source = fitz.open(pdf_path)
+
+
+def _write_worker_chapter(first, last, chapter_pdf_path, garbage, deflate):
+    return write_chapter(_worker_source, first, last, chapter_pdf_path, garbage, deflate)
+
+
+def split_chapters(analysis, chapters_dir, heading_pattern=None, use_toc=True, workers=1, garbage=3,
+                   deflate=True, chapter_docx=False, progress=None, cancel_event=None):
+    """
+    Split the analysed PDF into one PDF per chapter and return their paths.
+
+    With `workers` > 1 the chapter files are written by a process pool, one
+    chapter per task; each worker opens the source once (fitz documents cannot
+    be shared). On cancellation the chapters not started yet are dropped, so
+    it only waits for the (at most `workers`) chapters being written.
+    `garbage` and `deflate` are passed to fitz's save(). With `chapter_docx`
+    a DOCX with the chapter's text is written next to each chapter PDF.
+    """
+    ranges = chapter_ranges(find_chapter_starts(analysis, heading_pattern, use_toc), analysis.page_count)
+    os.makedirs(chapters_dir, exist_ok=True)
+
+    base_name = os.path.splitext(os.path.basename(analysis.pdf_path))[0]
+    chapter_paths = [os.path.join(chapters_dir, f'{base_name}_chapter_{i + 1}.pdf') for i in range(len(ranges))]
+    if progress:
+        progress('split', 0, len(ranges))
+
+    if workers > 1 and len(ranges) > 1:
+        workers = min(workers, len(ranges))
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_open_worker_source,
+                                       initargs=(analysis.pdf_path,))
+        try:
+            pending = {executor.submit(_write_worker_chapter, first, last, path, garbage, deflate)
+                       for (first, last), path in zip(ranges, chapter_paths)}
+            written = 0
+            while pending:
+                check_cancelled(cancel_event)
+                done, pending = wait(pending, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+                    written += 1
+                    if progress:
+                        progress('split', written, len(ranges))
+        except BaseException:
+            executor.shutdown(cancel_futures=True)
+            raise
+        executor.shutdown()
+    else:
+        for i, ((first, last), path) in enumerate(zip(ranges, chapter_paths)):
+            check_cancelled(cancel_event)
+            write_chapter(analysis.document, first, last, path, garbage, deflate)
+            if progress:
+                progress('split', i + 1, len(ranges))
+
+    if chapter_docx:
+        for (first, last), path in zip(ranges, chapter_paths):
+            check_cancelled(cancel_event)
+            export_pages((analysis.page_text(page_num) for page_num in range(first, last + 1)),
+                         os.path.splitext(path)[0] + '.docx')
+
+    return chapter_paths
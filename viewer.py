@@ -0,0 +1,279 @@
+import time #Built-in for Python 3.12.6
+import bisect #Built-in for Python 3.12.6
+import threading #Built-in for Python 3.12.6
+from collections import OrderedDict #Built-in for Python 3.12.6
+import fitz  # Also know as PyMuPDF, v1.24.10
+from PyQt5.QtWidgets import QApplication, QScrollArea, QWidget, QVBoxLayout, QLabel #v5.15.11
+from PyQt5.QtGui import QImage, QPixmap #v5.15.11
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal #v5.15.11
+
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024  # Budget for rendered pages kept in memory
+DEFAULT_PREFETCH = 2  # Pages rendered ahead of and behind the visible ones
+PAGE_SPACING = 10
+MIN_ZOOM = 0.25
+MAX_ZOOM = 4.0
+
+
+class PixmapCache:
+    """ LRU cache of rendered pages bounded by the total size of the pixmaps in bytes """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._items = OrderedDict()
+
+    def get(self, key):
+        pixmap = self._items.get(key)
+        if pixmap is not None:
+            self._items.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        if key in self._items:
+            self.size_bytes -= pixmap_bytes(self._items.pop(key))
+        self._items[key] = pixmap
+        self.size_bytes += pixmap_bytes(pixmap)
+        # Always keep the newest page, even if it alone is over budget
+        while self.size_bytes > self.max_bytes and len(self._items) > 1:
+            _, evicted = self._items.popitem(last=False)
+            self.size_bytes -= pixmap_bytes(evicted)
+
+    def clear(self):
+        self._items.clear()
+        self.size_bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+
+def pixmap_bytes(pixmap):
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+class PageRenderer(QThread):
+    """
+    Background thread that renders requested pages to QImages.
+
+    The thread keeps its own fitz document open (fitz objects must not be
+    shared between threads). Each request() replaces the pending queue, so
+    pages that scrolled out of view before their turn are never rendered.
+    page_timed reports how long every page took to render.
+    """
+    page_rendered = pyqtSignal(int, int, float, QImage)  # generation, page number, zoom, image
+    page_timed = pyqtSignal(str, int, float)  # pdf path, page number, seconds
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._condition = threading.Condition()
+        self._requests = []  # (generation, pdf_path, page_num, zoom), most urgent first
+        self._stopping = False
+
+    def request(self, generation, pdf_path, page_numbers, zoom):
+        with self._condition:
+            self._requests = [(generation, pdf_path, page_num, zoom) for page_num in page_numbers]
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            self._requests = []
+            self._condition.notify()
+        self.wait()
+
+    def run(self):
+        document = None
+        document_path = None
+        try:
+            while True:
+                with self._condition:
+                    while not self._requests and not self._stopping:
+                        self._condition.wait()
+                    if self._stopping:
+                        break
+                    generation, pdf_path, page_num, zoom = self._requests.pop(0)
+
+                try:
+                    start = time.perf_counter()
+                    if pdf_path != document_path:
+                        if document is not None:
+                            document.close()
+                        document = fitz.open(pdf_path)
+                        document_path = pdf_path
+                    pix = document.load_page(page_num).get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+                    # Copy: the QImage would otherwise point into the pixmap's buffer
+                    image = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format_RGB888).copy()
+                except Exception as e:
+                    print(f'Error rendering page {page_num + 1} of {pdf_path}: {e}')
+                    continue
+                self.page_timed.emit(pdf_path, page_num, time.perf_counter() - start)
+                self.page_rendered.emit(generation, page_num, zoom, image)
+        finally:
+            if document is not None:
+                document.close()
+
+
+class PageViewer(QScrollArea):
+    """
+    Scrollable view of a PDF's pages that only renders what is on screen.
+
+    Every page gets a placeholder of its final size so the scrollbar is right
+    from the start, but pixmaps are only rendered for the visible pages plus
+    `prefetch` pages around them, at a zoom that fits the viewport width.
+    Rendered pages live in a PixmapCache with a byte budget; placeholders that
+    scroll far out of view drop their pixmap so memory stays bounded.
+    page_timed(pdf path, page number, seconds) is emitted for every page rendered.
+    """
+    page_timed = pyqtSignal(str, int, float)
+
+    def __init__(self, parent=None, cache_bytes=DEFAULT_CACHE_BYTES, prefetch=DEFAULT_PREFETCH):
+        super().__init__(parent)
+        self.setWidgetResizable(True)
+        self.prefetch = prefetch
+        self.cache = PixmapCache(cache_bytes)
+        self.pdf_path = None
+        self.page_sizes = []  # (width, height) in points
+        self.labels = []
+        self.zoom = 1.0
+        self.generation = 0  # Bumped on every load/clear/zoom change to drop stale renders
+        self._shown = set()  # Pages whose label currently holds a pixmap
+
+        self.layout_widget = QWidget()
+        self.page_layout = QVBoxLayout(self.layout_widget)
+        self.page_layout.setSpacing(PAGE_SPACING)
+        self.page_layout.setAlignment(Qt.AlignTop | Qt.AlignHCenter)
+        self.setWidget(self.layout_widget)
+
+        self.renderer = PageRenderer(self)
+        self.renderer.page_rendered.connect(self.on_page_rendered)
+        self.renderer.page_timed.connect(self.page_timed)
+        self.renderer.start()
+        if QApplication.instance() is not None:
+            QApplication.instance().aboutToQuit.connect(self.shutdown)
+
+        # Coalesce bursts of scroll/resize events into one update
+        self.update_timer = QTimer(self)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(30)
+        self.update_timer.timeout.connect(self.update_visible_pages)
+        self.verticalScrollBar().valueChanged.connect(self.schedule_update)
+
+        self.relayout_timer = QTimer(self)
+        self.relayout_timer.setSingleShot(True)
+        self.relayout_timer.setInterval(100)
+        self.relayout_timer.timeout.connect(self.relayout)
+
+    def load(self, pdf_path):
+        """ Show `pdf_path`, replacing whatever document was shown before """
+        self.clear()
+        with fitz.open(pdf_path) as pdf_document:
+            self.page_sizes = [(page.rect.width, page.rect.height) for page in pdf_document]
+        self.pdf_path = pdf_path
+
+        for _ in self.page_sizes:
+            label = QLabel()
+            label.setAlignment(Qt.AlignCenter)
+            label.setStyleSheet('background-color: white; border: 1px solid #ccc;')
+            self.page_layout.addWidget(label)
+            self.labels.append(label)
+        self.relayout()
+
+    def clear(self):
+        """ Remove all pages and forget their rendered pixmaps """
+        self.generation += 1
+        self.renderer.request(self.generation, None, [], 1.0)
+        for label in self.labels:
+            self.page_layout.removeWidget(label)
+            label.deleteLater()
+        self.labels = []
+        self.page_sizes = []
+        self.pdf_path = None
+        self._shown.clear()
+        self.cache.clear()
+        self.verticalScrollBar().setValue(0)
+
+    def shutdown(self):
+        """ Stop the render thread; call before the viewer is destroyed """
+        self.renderer.stop()
+
+    def fit_zoom(self):
+        """ Zoom that makes the widest page fill the viewport width """
+        if not self.page_sizes:
+            return 1.0
+        available = self.viewport().width() - 2 * self.page_layout.contentsMargins().left()
+        widest = max(width for width, _ in self.page_sizes)
+        return max(MIN_ZOOM, min(MAX_ZOOM, available / widest))
+
+    def relayout(self):
+        """ Resize the placeholders for the current viewport width and re-render """
+        self.zoom = self.fit_zoom()
+        self.generation += 1
+        for page_num, label in enumerate(self.labels):
+            width, height = self.page_sizes[page_num]
+            label.setFixedSize(round(width * self.zoom), round(height * self.zoom))
+            label.clear()
+        self._shown.clear()
+        self.update_timer.start()
+
+    def schedule_update(self, *args):
+        # Not connected to update_timer.start directly: valueChanged(int) would pick start(msec)
+        self.update_timer.start()
+
+    def visible_pages(self):
+        """ Return the range of page numbers intersecting the viewport """
+        if not self.labels:
+            return range(0)
+        top = self.verticalScrollBar().value()
+        bottom = top + self.viewport().height()
+        tops = [label.y() for label in self.labels]
+        first = max(0, bisect.bisect_right(tops, top) - 1)
+        last = max(first, bisect.bisect_left(tops, bottom) - 1)
+        return range(first, min(last, len(self.labels) - 1) + 1)
+
+    def render_zoom(self):
+        # Render at device resolution so pages stay sharp on HiDPI screens
+        return self.zoom * self.devicePixelRatioF()
+
+    def update_visible_pages(self):
+        self.page_layout.activate()  # Make sure placeholder positions are current
+        visible = self.visible_pages()
+        if not visible:
+            return
+        first = max(0, visible.start - self.prefetch)
+        last = min(len(self.labels) - 1, visible.stop - 1 + self.prefetch)
+        wanted = list(visible) + [p for p in range(first, last + 1) if p not in visible]
+
+        # Pages that left the window give their pixmap back (the cache may keep it)
+        for page_num in self._shown - set(wanted):
+            self.labels[page_num].clear()
+        self._shown &= set(wanted)
+
+        zoom = self.render_zoom()
+        missing = []
+        for page_num in wanted:
+            if page_num in self._shown:
+                continue
+            pixmap = self.cache.get((page_num, zoom))
+            if pixmap is not None:
+                self.show_page(page_num, pixmap)
+            else:
+                missing.append(page_num)
+        self.renderer.request(self.generation, self.pdf_path, missing, zoom)
+
+    def on_page_rendered(self, generation, page_num, zoom, image):
+        if generation != self.generation:
+            return  # Rendered for a document or zoom that is no longer shown
+        pixmap = QPixmap.fromImage(image)
+        pixmap.setDevicePixelRatio(self.devicePixelRatioF())
+        self.cache.put((page_num, zoom), pixmap)
+        self.show_page(page_num, pixmap)
+
+    def show_page(self, page_num, pixmap):
+        self.labels[page_num].setPixmap(pixmap)
+        self._shown.add(page_num)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.labels and abs(self.fit_zoom() - self.zoom) > 0.01:
+            self.relayout_timer.start()
+        else:
+            self.update_timer.start()
@@ -0,0 +1,466 @@
+import os #Built-in for Python 3.12.6
+import sys #Built-in for Python 3.12.6
+import time #Built-in for Python 3.12.6
+import signal #Built-in for Python 3.12.6
+import sqlite3 #Built-in for Python 3.12.6
+import argparse #Built-in for Python 3.12.6
+import threading #Built-in for Python 3.12.6
+import multiprocessing #Built-in for Python 3.12.6
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait #Built-in for Python 3.12.6
+from concurrent.futures.process import BrokenProcessPool #Built-in for Python 3.12.6
+from engine import (process_file, pipeline_settings, cached_result, record_result, plan_workers, output_paths,
+                    add_pipeline_arguments, pipeline_options)
+from manifest import Manifest, settings_key
+from instrumentation import RunReport
+
+try:
+    # Optional, watchdog v6.0.0: inotify on Linux (FSEvents/ReadDirectoryChangesW elsewhere)
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+QUEUE_NAME = '.ocr_queue.sqlite'
+DEFAULT_SETTLE_SECONDS = 5.0  # How long a file must stay unchanged before it counts as completely written
+DEFAULT_POLL_INTERVAL = 2.0
+RESCAN_INTERVAL = 60.0  # Full folder scans while watchdog delivers events, in case one was missed
+MAX_ATTEMPTS = 3  # Interrupted runs of one job before it is marked failed
+
+
+class JobQueue:
+    """
+    Durable queue of the files waiting to be processed, stored next to the manifest.
+
+    A job goes pending -> running -> done or failed, and every change is
+    committed before the daemon acts on it, so nothing is lost when the daemon
+    stops. Jobs have the same key as the manifest entries (content hash,
+    pipeline settings and output directory), so a file saved again with the
+    same content is not queued twice, while a copy under another name (another
+    output directory) or a restart with other settings gets its own job.
+    Jobs left 'running' by a daemon that died are put back by recover().
+
+    A JobQueue must be used from the thread that created it (sqlite3 rule).
+    """
+
+    def __init__(self, output_path):
+        os.makedirs(output_path, exist_ok=True)
+        self.path = os.path.join(output_path, QUEUE_NAME)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                content_hash TEXT NOT NULL,
+                settings_key TEXT NOT NULL,
+                output_dir TEXT NOT NULL,
+                path TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                enqueued_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                UNIQUE (content_hash, settings_key, output_dir)
+            );
+            CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, id);
+        ''')
+
+    def enqueue(self, path, content_hash, settings, output_dir):
+        """
+        Queue `path` and return 'queued', or the state of the job that already
+        has its key ('pending', 'running' or 'failed') if it was not queued.
+
+        A 'done' job is queued again: the caller only enqueues files the
+        manifest does not hold, so its outputs must have been deleted since.
+        """
+        key = (content_hash, settings_key(settings), os.path.abspath(output_dir))
+        now = time.time()
+        with self.connection:
+            row = self.connection.execute(
+                'SELECT id, state FROM jobs WHERE content_hash = ? AND settings_key = ? AND output_dir = ?',
+                key).fetchone()
+            if row is None:
+                self.connection.execute(
+                    "INSERT INTO jobs (content_hash, settings_key, output_dir, path, state, enqueued_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, 'pending', ?, ?)", key + (os.path.abspath(path), now, now))
+                return 'queued'
+            job_id, state = row
+            if state != 'done':
+                return state
+            self.connection.execute(
+                "UPDATE jobs SET state = 'pending', path = ?, attempts = 0, error = NULL, enqueued_at = ?, "
+                "updated_at = ? WHERE id = ?", (os.path.abspath(path), now, now, job_id))
+        return 'queued'
+
+    def claim(self, limit):
+        """ Mark up to `limit` of the oldest pending jobs as running and return their (id, path) """
+        if limit <= 0:
+            return []
+        with self.connection:
+            rows = self.connection.execute(
+                "SELECT id, path FROM jobs WHERE state = 'pending' ORDER BY id LIMIT ?", (limit,)).fetchall()
+            self.connection.executemany(
+                "UPDATE jobs SET state = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                [(time.time(), job_id) for job_id, _ in rows])
+        return rows
+
+    def complete(self, job_id, error=None):
+        """ Mark a job done, or failed with `error` """
+        with self.connection:
+            self.connection.execute('UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE id = ?',
+                                    ('failed' if error else 'done', error, time.time(), job_id))
+
+    def release(self, job_id, error):
+        """ Put an interrupted job back in the queue, or fail it once it used up MAX_ATTEMPTS """
+        with self.connection:
+            self.connection.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, updated_at = ? WHERE id = ?", (MAX_ATTEMPTS, error, time.time(), job_id))
+
+    def recover(self, retry_failed=False):
+        """
+        Requeue the jobs a previous daemon left running and return how many.
+
+        A job that was interrupted MAX_ATTEMPTS times (e.g. a file that keeps
+        crashing the machine) is failed instead. With `retry_failed` the failed
+        jobs get a fresh set of attempts as well.
+        """
+        now = time.time()
+        with self.connection:
+            self.connection.execute(
+                "UPDATE jobs SET state = 'failed', error = 'Interrupted too often', updated_at = ? "
+                "WHERE state = 'running' AND attempts >= ?", (now, MAX_ATTEMPTS))
+            cursor = self.connection.execute(
+                "UPDATE jobs SET state = 'pending', updated_at = ? WHERE state = 'running'", (now,))
+            recovered = cursor.rowcount
+            if retry_failed:
+                cursor = self.connection.execute(
+                    "UPDATE jobs SET state = 'pending', attempts = 0, error = NULL, updated_at = ? "
+                    "WHERE state = 'failed'", (now,))
+                recovered += cursor.rowcount
+        return recovered
+
+    def counts(self):
+        """ Number of jobs per state """
+        return dict(self.connection.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def is_candidate(path):
+    """ PDFs only, ignoring hidden and temporary files such as '.scan.pdf' or '~scan.pdf' """
+    name = os.path.basename(path)
+    return name.lower().endswith('.pdf') and not name.startswith(('.', '~'))
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    """ Forwards watchdog events (from the observer's thread) to a FolderWatcher """
+
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        path = getattr(event, 'dest_path', None) or event.src_path  # Moves report the new name
+        self.watcher.notify(os.fsdecode(path))
+
+
+class FolderWatcher:
+    """
+    Report the PDFs that appear in a folder once they are completely written.
+
+    A file is taken to be finished when its size and modification time have
+    not changed for `settle_seconds`, since scanners and network copies give
+    no other signal. With watchdog installed the folder is watched through
+    inotify (or the platform's equivalent) and only rescanned every
+    RESCAN_INTERVAL seconds in case an event was lost; without it the folder
+    is scanned on every call of ready_files().
+    """
+
+    def __init__(self, input_dir, settle_seconds=DEFAULT_SETTLE_SECONDS, use_watchdog=True):
+        self.input_dir = os.path.abspath(input_dir)
+        self.settle_seconds = settle_seconds
+        self.use_watchdog = use_watchdog and Observer is not None
+        self.wakeup = threading.Event()  # Set on every change, and by whoever wants the daemon loop to wake up
+        self.observer = None
+        self._candidates = set()
+        self._lock = threading.Lock()
+        self._observed = {}  # path -> ((size, mtime_ns), monotonic time it was first seen like that)
+        self._reported = {}  # path -> (size, mtime_ns) it had when ready_files() returned it
+        self._last_scan = None
+
+    @property
+    def mode(self):
+        return 'inotify' if self.use_watchdog else 'polling'
+
+    def start(self):
+        if self.use_watchdog:
+            self.observer = Observer()
+            self.observer.schedule(_ChangeHandler(self), self.input_dir, recursive=False)
+            self.observer.start()
+
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+
+    def notify(self, path):
+        """ Note a possible change to `path`; safe to call from any thread """
+        if is_candidate(path):
+            with self._lock:
+                self._candidates.add(path)
+            self.wakeup.set()
+
+    def scan(self):
+        for entry in os.scandir(self.input_dir):
+            if entry.is_file() and is_candidate(entry.path):
+                self.notify(entry.path)
+
+    def ready_files(self):
+        """ Return the files that have settled since the last call """
+        now = time.monotonic()
+        if self.observer is None or self._last_scan is None or now - self._last_scan >= RESCAN_INTERVAL:
+            self.scan()
+            self._last_scan = now
+
+        with self._lock:
+            candidates, self._candidates = self._candidates, set()
+        ready = []
+        unsettled = set()
+        for path in candidates:
+            try:
+                stat = os.stat(path)
+            except OSError:  # Deleted or moved away again
+                self._observed.pop(path, None)
+                self._reported.pop(path, None)
+                continue
+            state = (stat.st_size, stat.st_mtime_ns)
+            if self._reported.get(path) == state:
+                continue
+            seen = self._observed.get(path)
+            if seen is None or seen[0] != state:
+                self._observed[path] = (state, now)
+                unsettled.add(path)
+            elif stat.st_size == 0 or now - seen[1] < self.settle_seconds:
+                unsettled.add(path)
+            else:
+                del self._observed[path]
+                self._reported[path] = state
+                ready.append(path)
+
+        # Files still being written stay candidates even if no further event arrives for them
+        with self._lock:
+            self._candidates |= unsettled
+        return sorted(ready)
+
+
+def _ignore_interrupts():
+    """ Pool initializer: Ctrl+C stops the daemon, which lets the running files finish """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class WatchDaemon:
+    """
+    Process every PDF dropped into `input_dir` into `output_path`, until stop() is called.
+
+    Settled files are hashed and added to the JobQueue; jobs are taken off the
+    queue only when a worker is free, so a burst of scans waits on disk rather
+    than piling up in the process pool. The results go through the same
+    manifest as engine.process_batch, which also catches content that was
+    processed before the queue existed. stop() lets the running files finish
+    and leaves the rest queued for the next start.
+    """
+
+    def __init__(self, input_dir, output_path, workers=None, jobs=None, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 poll_interval=DEFAULT_POLL_INTERVAL, use_watchdog=True, retry_failed=False, on_result=None,
+                 report=None, **options):
+        self.output_path = output_path
+        self.watcher = FolderWatcher(input_dir, settle_seconds, use_watchdog)
+        split_options = options.get('split_options') or {}
+        self.workers, self.jobs, split_workers = plan_workers(workers or os.cpu_count() or 1, workers, jobs,
+                                                              split_workers=split_options.get('workers', 1))
+        options['split_options'] = dict(split_options, workers=split_workers)
+        self.capacity = self.workers  # Drops to 1 after a worker crash, see collect()
+        self.poll_interval = poll_interval
+        self.retry_failed = retry_failed
+        self.on_result = on_result
+        self.report = report
+        self.options = options
+        self.settings = pipeline_settings(options.get('ocr_mode', 'hybrid'), options.get('split_options'))
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        """ Ask run() to return after the running files; safe to call from signal handlers and other threads """
+        self.stop_event.set()
+        self.watcher.wakeup.set()
+
+    def run(self):
+        queue = JobQueue(self.output_path)
+        manifest = Manifest(self.output_path)
+        running = {}  # future -> (job_id, path)
+        executor = None
+        try:
+            recovered = queue.recover(self.retry_failed)
+            if recovered:
+                print(f'Requeued {recovered} unfinished job(s)')
+            self.watcher.start()
+            executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_ignore_interrupts)
+            while not self.stop_event.is_set():
+                for path in self.watcher.ready_files():
+                    self.enqueue(queue, manifest, path)
+
+                # Backpressure: jobs leave the queue only as workers become free
+                for job_id, path in queue.claim(self.capacity - len(running)):
+                    cached = cached_result(manifest, path, self.output_path, self.settings)
+                    if cached:
+                        self.finish(queue, manifest, job_id, cached)
+                    else:
+                        future = executor.submit(process_file, path, self.output_path, self.jobs, **self.options)
+                        running[future] = (job_id, path)
+
+                if running:
+                    done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                else:
+                    done = ()
+                    self.watcher.wakeup.wait(self.poll_interval)
+                    self.watcher.wakeup.clear()
+                executor = self.collect(queue, manifest, executor, running, done)
+
+            # Stopping: finish what is running, everything else stays pending for the next start
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                executor = self.collect(queue, manifest, executor, running, done, restart=False)
+        finally:
+            self.watcher.stop()
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            queue.close()
+            manifest.close()
+
+    def enqueue(self, queue, manifest, path):
+        """ Queue a settled file unless the manifest or the queue already covers it, saying which """
+        try:
+            content_hash = manifest.content_hash(path)
+        except OSError as e:
+            print(f'[not queued] {path}: {e}')  # Gone again before it could be read
+            return
+        if cached_result(manifest, path, self.output_path, self.settings):
+            print(f'[skipped] {path}: already processed with these settings')
+            return
+        state = queue.enqueue(path, content_hash, self.settings, output_paths(path, self.output_path)['output_dir'])
+        if state == 'queued':
+            print(f'[queued] {path}')
+        elif state == 'failed':
+            print(f'[not queued] {path}: failed before, start with --retry-failed to try it again')
+        else:
+            print(f'[not queued] {path}: already {state}')
+
+    def collect(self, queue, manifest, executor, running, done, restart=True):
+        """ Record the finished futures; return the executor to use next (a new one if a worker died) """
+        broken = False
+        for future in done:
+            broken |= self.collect_one(queue, manifest, future, *running.pop(future))
+        if broken:
+            # The pool is unusable: its other jobs fail right away, requeue them too and start a new pool.
+            # The crash cannot be pinned on one job, so jobs run one at a time until one finishes cleanly;
+            # that way only the job that really crashes uses up its attempts.
+            self.capacity = 1
+            wait(running)
+            for future in list(running):
+                self.collect_one(queue, manifest, future, *running.pop(future))
+            executor.shutdown(cancel_futures=True)
+            if restart:
+                executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_ignore_interrupts)
+        return executor
+
+    def collect_one(self, queue, manifest, future, job_id, path):
+        """ Finish the job of a completed future; return True if its worker process died """
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            # A worker process died (e.g. killed by the OS), so the job gets another attempt
+            queue.release(job_id, f'{type(e).__name__}: {e}')
+            print(f'[interrupted] {path}: worker process died')
+            return True
+        except Exception as e:
+            result = {'input': path, 'status': 'error', 'error': f'{type(e).__name__}: {e}'}
+        self.capacity = self.workers
+        self.finish(queue, manifest, job_id, result)
+        return False
+
+    def finish(self, queue, manifest, job_id, result):
+        metrics = result.pop('metrics', None)
+        if self.report is not None:
+            self.report.merge(metrics)
+        # The manifest is written first: if the daemon dies in between, the requeued job is skipped as cached
+        record_result(manifest, self.output_path, self.settings, result)
+        queue.complete(job_id, result['error'] if result['status'] == 'error' else None)
+        if self.on_result:
+            self.on_result(result)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Watch a folder and process every PDF dropped into it')
+    parser.add_argument('input', help='Folder to watch')
+    parser.add_argument('-o', '--output', required=True, help='Output directory (also holds the job queue)')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Number of files processed in parallel (default: based on CPU count)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='ocrmypdf jobs per file (default: cores left over per worker)')
+    add_pipeline_arguments(parser)
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help='Seconds a file must stay unchanged before it is processed')
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help='Seconds between checks of the folder and the running jobs')
+    parser.add_argument('--polling', action='store_true',
+                        help='Poll the folder even if watchdog (inotify) is available')
+    parser.add_argument('--retry-failed', action='store_true', help='Queue the failed jobs again on start')
+    parser.add_argument('--status', action='store_true', help='Print the number of jobs per state and exit')
+    parser.add_argument('--no-report', action='store_true',
+                        help='Do not write the timing report to <output>/reports on exit')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.status:
+        with JobQueue(args.output) as queue:
+            counts = queue.counts()
+        for state in ('pending', 'running', 'done', 'failed'):
+            print(f'{state:8} {counts.get(state, 0)}')
+        return 0
+
+    def report(result):
+        message = result['error'] if result['status'] == 'error' else result.get('docx')
+        print(f"[{result['status']}] {result['input']}: {message}")
+
+    run_report = RunReport()
+    daemon = WatchDaemon(args.input, args.output, args.workers, args.jobs, settle_seconds=args.settle,
+                         poll_interval=args.poll_interval, use_watchdog=not args.polling,
+                         retry_failed=args.retry_failed, on_result=report, report=run_report,
+                         **pipeline_options(args))
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *_: daemon.stop())
+
+    print(f'Watching {daemon.watcher.input_dir} ({daemon.watcher.mode}) with {daemon.workers} worker(s), '
+          f'Ctrl+C to stop')
+    daemon.run()
+    print('Stopped, unfinished jobs stay queued')
+    if not args.no_report and run_report.stages:
+        print(f'Report written to {run_report.write(os.path.join(args.output, "reports"))}')
+    return 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
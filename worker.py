@@ -0,0 +1,83 @@
+import threading #Built-in for Python 3.12.6
+from PyQt5.QtCore import QObject, QThread, pyqtSignal #v5.15.11
+import engine
+from manifest import Manifest
+
+
+class ProcessWorker(QObject):
+    """
+    Runs the engine pipeline for a list of files off the GUI thread.
+
+    Files are processed one after another in this thread (ocrmypdf already
+    spreads a single file over all cores); progress is streamed back through
+    queued signals so the UI stays responsive.
+    """
+    file_started = pyqtSignal(str, int, int)  # path, index, file count
+    page_progress = pyqtSignal(str, str, int, int)  # path, stage, page, page count
+    file_finished = pyqtSignal(dict)  # engine.process_file result, the receiver closes its analyses
+    finished = pyqtSignal(list)  # all results, in processing order
+
+    def __init__(self, selected_files, output_path, incremental=False, preview_chars=0, report=None):
+        super().__init__()
+        self.selected_files = list(selected_files)
+        self.output_path = output_path
+        self.incremental = incremental  # Skip files the output manifest already has
+        self.preview_chars = preview_chars  # Exported text handed back for display
+        self.report = report  # RunReport that collects each file's stage timings
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        results = []
+        settings = engine.pipeline_settings()
+        # Opened here: the sqlite connection belongs to this thread
+        manifest = Manifest(self.output_path) if self.incremental else None
+        # Inputs that would overwrite an earlier input's output folder are not processed
+        conflicts = engine.output_conflicts(self.selected_files, self.output_path)
+        try:
+            for index, selected_file in enumerate(self.selected_files):
+                if self.cancel_event.is_set():
+                    break
+                self.file_started.emit(selected_file, index, len(self.selected_files))
+
+                def progress(stage, done, total, selected_file=selected_file):
+                    self.page_progress.emit(selected_file, stage, done, total)
+
+                if index in conflicts:
+                    result = engine.conflict_result(selected_file, conflicts[index], self.output_path)
+                else:
+                    result = engine.cached_result(manifest, selected_file, self.output_path, settings) if manifest else None
+                if result is None:
+                    result = engine.process_file(selected_file, self.output_path,
+                                                 progress=progress, cancel_event=self.cancel_event,
+                                                 keep_analysis=True, preview_chars=self.preview_chars)
+                    metrics = result.pop('metrics', None)
+                    if self.report is not None:
+                        self.report.merge(metrics)
+                    if manifest is not None:
+                        engine.record_result(manifest, self.output_path, settings, result)
+                results.append(result)
+                self.file_finished.emit(result)
+        finally:
+            if manifest is not None:
+                manifest.close()
+            self.finished.emit(results)
+
+    def cancel(self):
+        """ Ask the worker to stop before its next page; safe to call from any thread """
+        self.cancel_event.set()
+
+
+def start_worker(worker, parent=None):
+    """
+    Move `worker` to a new QThread, start it and return the thread.
+
+    The thread is owned by `parent` and deletes itself once it has stopped, so
+    callers may drop their reference as soon as the worker reports `finished`.
+    """
+    thread = QThread(parent)
+    worker.moveToThread(thread)
+    thread.started.connect(worker.run)
+    worker.finished.connect(thread.quit)
+    thread.finished.connect(thread.deleteLater)
+    thread.start()
+    return thread